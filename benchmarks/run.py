@@ -0,0 +1,324 @@
+#! /usr/bin/env python
+"""
+Benchmarks of the rootils conversions, plots and rools operations, on synthetic
+arrays and ROOT files created in a temporary directory.
+
+    python benchmarks/run.py -o results.json
+    python benchmarks/run.py -o results.json --baseline baseline.json
+
+Each benchmark runs --repeat times for each size, and the min and median wall
+times are written as json. With --baseline, the results are compared with a
+previous json output and the exit code is 1 if something is slower than
+--tolerance (default 20%).
+"""
+
+import os
+import sys
+import json
+import time
+import ctypes
+import shutil
+import platform
+import argparse
+import tempfile
+import contextlib
+import importlib.util
+import importlib.machinery
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+import ROOT
+ROOT.PyConfig.IgnoreCommandLineOptions = True
+ROOT.gROOT.SetBatch(True)
+
+import rootils.utils as ut
+import rootils.plots as plots
+import rootils.registry as registry
+
+
+def load_rools():
+    if 'rools' in sys.modules:
+        return sys.modules['rools']
+
+    path = os.path.join(repo_dir, 'scripts', 'rools')
+    loader = importlib.machinery.SourceFileLoader('rools', path)
+    spec = importlib.util.spec_from_loader('rools', loader)
+    module = importlib.util.module_from_spec(spec)
+
+    # the merge workers unpickle functions from it
+    sys.modules['rools'] = module
+    loader.exec_module(module)
+
+    return module
+
+
+@contextlib.contextmanager
+def quiet():
+    # output and progress of rools, at the fd level so the ROOT C++ output goes too
+    libc = ctypes.CDLL(None)
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = os.dup(1), os.dup(2)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        libc.fflush(None)
+        os.dup2(saved[0], 1)
+        os.dup2(saved[1], 2)
+        for fd in saved + (devnull,):
+            os.close(fd)
+
+
+#------
+# Data
+#------
+def make_arrays(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=n), rng.normal(1., 2., size=n), rng.exponential(size=n)
+
+
+def make_tree_file(path, n):
+    df = ROOT.RDataFrame(n)
+    df = df.Define('x', 'gRandom->Gaus(0, 1)').Define('y', 'gRandom->Exp(1)').Define('i', '(int)rdfentry_')
+    df.Snapshot('t', path, ['x', 'y', 'i'])
+
+
+def make_hists_file(path, n):
+    f = ROOT.TFile(path, 'recreate')
+    for i in range(n):
+        h = ROOT.TH1F('h%i' % i, '', 100, -5, 5)
+        h.FillRandom('gaus', 1000)
+        h.Write()
+    f.Close()
+
+
+def make_dir(path, n_files, n_entries):
+    os.makedirs(path)
+    for i in range(n_files):
+        fn = os.path.join(path, 'f%i.root' % i)
+        make_tree_file(fn, n_entries)
+        f = ROOT.TFile(fn, 'update')
+        h = ROOT.TH1F('hist', '', 100, -5, 5)
+        h.FillRandom('gaus', 1000)
+        h.Write()
+        f.Close()
+
+
+#------------
+# Benchmarks
+#------------
+def bench_array_to_hist(tmp, n):
+    x, _, _ = make_arrays(n)
+    return lambda: ut.array_to_hist(x, 100, -5, 5)
+
+def bench_array_to_hist2d(tmp, n):
+    x, y, _ = make_arrays(n)
+    return lambda: ut.array_to_hist2d(x, y, nx=100, xmin=-5, xmax=5, ny=100, ymin=-5, ymax=7)
+
+def bench_array_to_graph(tmp, n):
+    x, y, _ = make_arrays(n)
+    return lambda: ut.array_to_graph(x, y)
+
+def bench_sort_graph(tmp, n):
+    x, y, _ = make_arrays(n)
+    g = ut.array_to_graph(x, y)
+    return lambda: ut.sort_graph(g)
+
+def bench_plots_hists(tmp, n):
+    x, y, _ = make_arrays(n)
+    df = pd.DataFrame({'x': x, 'y': y})
+    save = os.path.join(tmp, 'hists.png')
+    def run():
+        plots.hists(df, ['x', 'y'], bins=(100, -5, 7), save=save)
+        registry.release()
+    return run
+
+def bench_plots_lines(tmp, n):
+    x, y, _ = make_arrays(n)
+    x = np.sort(x)
+    save = os.path.join(tmp, 'lines.png')
+    def run():
+        plots.lines(x=x, y=[y,], labels=['y'], downsample='lttb', save=save)
+        registry.release()
+    return run
+
+def bench_rools_list(tmp, n):
+    path = os.path.join(tmp, 'hists_%i.root' % n)
+    make_hists_file(path, n)
+    rools = load_rools()
+    return lambda: rools.main([path])
+
+def bench_rools_count(tmp, n):
+    path = os.path.join(tmp, 'tree_%i.root' % n)
+    make_tree_file(path, n)
+    rools = load_rools()
+    return lambda: rools.main([path, 't', '-c', '-s', 'x > 0'])
+
+def bench_rools_scan(tmp, n):
+    path = os.path.join(tmp, 'tree_%i.root' % n)
+    if not os.path.exists(path):
+        make_tree_file(path, n)
+    rools = load_rools()
+    return lambda: rools.main([path, 't', '--scan', 'x:y:i', '--sort', 'x', '-n', '10'])
+
+def bench_rools_merge(tmp, n):
+    path = os.path.join(tmp, 'dir_%i' % n)
+    make_dir(path, n, 1000)
+    rools = load_rools()
+    return lambda: rools.main([path, 'hist'])
+
+
+# name, function, sizes, quick sizes
+benchmarks = [
+    ('array_to_hist',   bench_array_to_hist,   [10**4, 10**5, 10**6, 10**7], [10**4, 10**6]),
+    ('array_to_hist2d', bench_array_to_hist2d, [10**4, 10**5, 10**6, 10**7], [10**4, 10**6]),
+    ('array_to_graph',  bench_array_to_graph,  [10**4, 10**5, 10**6, 10**7], [10**4, 10**6]),
+    ('sort_graph',      bench_sort_graph,      [10**4, 10**5, 10**6],        [10**4, 10**5]),
+    ('plots.hists',     bench_plots_hists,     [10**3, 10**5, 10**6],        [10**3, 10**5]),
+    ('plots.lines',     bench_plots_lines,     [10**3, 10**5, 10**6],        [10**3, 10**5]),
+    ('rools.list',      bench_rools_list,      [10, 100, 1000],              [10, 100]),
+    ('rools.count',     bench_rools_count,     [10**4, 10**5, 10**6],        [10**4, 10**5]),
+    ('rools.scan',      bench_rools_scan,      [10**4, 10**5, 10**6],        [10**4, 10**5]),
+    ('rools.merge',     bench_rools_merge,     [10, 50, 200],                [10, 50]),
+]
+
+
+def timeit(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with quiet():
+            func()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def run(names=None, quick=False, repeat=3, progress=True):
+
+    tmp = tempfile.mkdtemp(prefix='rootils_bench')
+
+    # the rools directory index and the rootils tree cache go to tmp, not to the user cache
+    environ = dict(os.environ)
+    os.environ['ROOLS_CACHE'] = os.path.join(tmp, 'rools_cache')
+    os.environ['ROOTILS_CACHE'] = os.path.join(tmp, 'rootils_cache')
+
+    results = []
+    try:
+        for name, bench, sizes, quick_sizes in benchmarks:
+            if names and not any(n in name for n in names):
+                continue
+
+            for size in (quick_sizes if quick else sizes):
+                with quiet():
+                    func = bench(tmp, size)
+
+                # first call outside the timing (ROOT jit, caches, index)
+                with quiet():
+                    func()
+
+                times = timeit(func, repeat)
+
+                result = OrderedDict([
+                    ('name', name),
+                    ('size', size),
+                    ('min', min(times)),
+                    ('median', float(np.median(times))),
+                    ('repeat', repeat),
+                ])
+                results.append(result)
+
+                if progress:
+                    sys.stderr.write('%-16s %10i %10.4f s\n' % (name, size, result['min']))
+    finally:
+        os.environ.clear()
+        os.environ.update(environ)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    return results
+
+
+def metadata():
+    return OrderedDict([
+        ('date', time.strftime('%Y-%m-%d %H:%M:%S')),
+        ('python', platform.python_version()),
+        ('root', ROOT.gROOT.GetVersion()),
+        ('numpy', np.__version__),
+        ('machine', platform.machine()),
+        ('node', platform.node()),
+        ('cpus', os.cpu_count()),
+    ])
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Print the ratio to the baseline min time of each benchmark.
+    Return the number of benchmarks slower than 1+tolerance
+    """
+    base = dict([ ((r['name'], r['size']), r['min']) for r in baseline['results'] ])
+
+    slower = 0
+    for r in results:
+        key = (r['name'], r['size'])
+        if key not in base:
+            continue
+
+        ratio = r['min'] / base[key] if base[key] > 0 else float('inf')
+        flag = ''
+        if ratio > 1 + tolerance:
+            flag = 'SLOWER'
+            slower += 1
+        elif ratio < 1 - tolerance:
+            flag = 'faster'
+
+        print('%-16s %10i %10.4f s %10.4f s %6.2fx %s' % (r['name'], r['size'], r['min'], base[key], ratio, flag))
+
+    return slower
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='rootils benchmarks')
+
+    parser.add_argument('names', nargs='*', help='Run only the benchmarks with these names (or part of them)')
+    parser.add_argument('-o', '--output', help='Write the results to this json file')
+    parser.add_argument('--baseline', help='Compare with the results in this json file')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown with respect to the baseline')
+    parser.add_argument('--quick', action='store_true', help='Only the small sizes')
+    parser.add_argument('--repeat', type=int, default=3)
+
+    args = parser.parse_args()
+
+    results = run(args.names, args.quick, args.repeat)
+
+    output = OrderedDict([('meta', metadata()), ('results', results)])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=1)
+    elif not args.baseline:
+        json.dump(output, sys.stdout, indent=1)
+        print('')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance) > 0:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
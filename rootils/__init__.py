@@ -2,6 +2,13 @@ from .utils import guess_binning
 from .utils import array_to_hist
 from .utils import array_to_graph
 
+from .stream import HistStream
+from .stream import stream_to_hist
+
+from .hist import Hist
+
+from .cache import TreeCache
+
 from .plots import lines
 from .plots import hists
 from .plots import hists_ratio
@@ -18,3 +25,18 @@ try:
     del utils
 except:
     pass
+
+try:
+    del stream
+except:
+    pass
+
+try:
+    del hist
+except:
+    pass
+
+try:
+    del cache
+except:
+    pass
@@ -0,0 +1,91 @@
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import ROOT
+
+import rootils.utils as ut
+import rootils.registry as registry
+import rootils.plots as plots
+
+
+def _init_worker():
+    # each worker has its own ROOT and gStyle, set once
+    ROOT.gROOT.SetBatch(True)
+    ut.default_style()
+
+
+def render_one(spec):
+    """
+    Draw and save one plot spec: a dict with the plots function name in 'plot'
+    and its arguments, e.g. {'plot': 'hists', 'data': df, 'x': ['pt'], 'save': 'pt.pdf'}.
+    Returns a dict with the plot, save, time (s) and error (None if ok)
+    """
+    spec = dict(spec)
+    name = spec.pop('plot')
+
+    result = {'plot': name, 'save': spec.get('save'), 'time': 0., 'error': None}
+
+    start = time.time()
+    try:
+        getattr(plots, name)(**spec)
+    except Exception:
+        result['error'] = traceback.format_exc()
+    finally:
+        # workers live for the whole batch: free everything of this plot
+        registry.release()
+
+    result['time'] = time.time() - start
+
+    return result
+
+
+def render(specs, n_jobs=-1, progress=False):
+    """
+    Render all the plot specs (see render_one) in a pool of n_jobs processes
+    (-1: all the cpus). The spec arguments must be picklable (DataFrames, arrays,
+    dicts of arrays, Hist, histograms; not trees).
+    Failures do not stop the batch: the results, in the same order as specs,
+    have the time and the error traceback of each plot
+    """
+    specs = list(specs)
+
+    if n_jobs is None or n_jobs < 1:
+        n_jobs = os.cpu_count() or 1
+
+    results = [None] * len(specs)
+
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker) as pool:
+        futures = dict([ (pool.submit(render_one, spec), i) for i, spec in enumerate(specs) ])
+
+        for n, future in enumerate(as_completed(futures)):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception:
+                # the spec could not be sent to the worker, or the worker died
+                results[i] = {'plot': specs[i].get('plot'), 'save': specs[i].get('save'),
+                              'time': 0., 'error': traceback.format_exc()}
+
+            if progress:
+                sys.stderr.write('\r%i/%i' % (n+1, len(specs)))
+                sys.stderr.flush()
+
+    if progress:
+        sys.stderr.write('\n')
+
+    return results
+
+
+def summary(results):
+    """
+    Print the total/slowest times and the failed plots of a render() batch
+    """
+    failed = [ r for r in results if r['error'] is not None ]
+    times = [ r['time'] for r in results ]
+
+    print('%i plots, %i failed, %.2f s total (max %.2f s)' % (len(results), len(failed), sum(times), max(times + [0.,])))
+    for r in failed:
+        print('%s %s: %s' % (r['plot'], r['save'], r['error'].strip().split('\n')[-1]))
@@ -0,0 +1,150 @@
+import math
+import numpy as np
+
+from rootils.stream import iter_chunks
+
+_lgamma = np.vectorize(math.lgamma, otypes=['float64'])
+
+
+class Summary(object):
+    """
+    One pass summary of a (possibly out-of-core) array: exact count, min, max,
+    mean and variance, plus a uniform random sample of at most sample_size values
+    (bottom-k sampling on random keys, so chunks can be added in any order).
+
+    Quantiles estimated from the sample have a rank error below
+    rank_error(sample_size, delta) with probability 1-delta (DKW inequality).
+    """
+
+    def __init__(self, sample_size=100000, seed=None):
+        self.sample_size = sample_size
+        self.rng = np.random.default_rng(seed)
+
+        self.n = 0
+        self.vmin = np.inf
+        self.vmax = -np.inf
+        self.mean = 0.
+        self.m2 = 0.
+
+        self.sample = np.zeros(0)
+        self.keys = np.zeros(0)
+
+    def update(self, chunk):
+
+        chunk = np.asarray(chunk, dtype='float64').ravel()
+        chunk = chunk[np.isfinite(chunk)]
+        if len(chunk) == 0:
+            return self
+
+        # exact moments (Chan et al. parallel update)
+        n, mean = len(chunk), np.mean(chunk)
+        m2 = np.sum((chunk - mean)**2)
+        delta = mean - self.mean
+        total = self.n + n
+        self.mean += delta * n / total
+        self.m2 += m2 + delta**2 * self.n * n / total
+        self.n = total
+
+        self.vmin = min(self.vmin, np.min(chunk))
+        self.vmax = max(self.vmax, np.max(chunk))
+
+        # keep the values with the smallest random keys
+        keys = np.concatenate([self.keys, self.rng.random(n)])
+        sample = np.concatenate([self.sample, chunk])
+        if len(keys) > self.sample_size:
+            keep = np.argpartition(keys, self.sample_size)[:self.sample_size]
+            keys, sample = keys[keep], sample[keep]
+
+        self.keys, self.sample = keys, sample
+
+        return self
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / self.n) if self.n > 0 else 0.
+
+    @property
+    def exact(self):
+        return self.n <= self.sample_size
+
+    def quantile(self, q):
+        return np.quantile(self.sample, q)
+
+
+def rank_error(sample_size, delta=0.01):
+    """
+    Max error in the quantile rank (as a fraction of the entries) for a sample
+    of sample_size values, with probability 1-delta
+    """
+    return math.sqrt(math.log(2. / delta) / (2. * sample_size))
+
+
+def summarize(source, sample_size=100000, chunk_size=1000000, seed=None):
+    summary = Summary(sample_size, seed)
+    for chunk in iter_chunks(source, chunk_size):
+        summary.update(chunk)
+    return summary
+
+
+def _nbins_from_width(summary, width, max_bins):
+    if width <= 0:
+        return 100
+    return int(min(max(math.ceil((summary.vmax - summary.vmin) / width), 1), max_bins))
+
+
+def _knuth_nbins(summary, max_bins):
+    """
+    Number of bins maximizing the Knuth (2006) posterior, evaluated on the sample
+    """
+    data = summary.sample
+    n = len(data)
+
+    best, best_logp = 1, -np.inf
+    for m in range(1, min(max_bins, n) + 1):
+        counts, _ = np.histogram(data, bins=m, range=(summary.vmin, summary.vmax))
+        logp = n * math.log(m) + math.lgamma(0.5 * m) - m * math.lgamma(0.5) \
+            - math.lgamma(n + 0.5 * m) + np.sum(_lgamma(counts + 0.5))
+        if logp > best_logp:
+            best, best_logp = m, logp
+
+    return best
+
+
+def guess_edges(source, method='fd', nbins=None, sample_size=100000, chunk_size=1000000, max_bins=1000, seed=None):
+    """
+    Bin edges for source (array, memmap, .npy path or iterable of chunks),
+    computed in a single pass, to use as array_to_hist(xbins=edges).
+
+    - fd: Freedman-Diaconis, width = 2 IQR / n^(1/3)
+    - scott: width = 3.49 sigma / n^(1/3)
+    - knuth: number of bins maximizing the Knuth posterior
+    - quantile: nbins (default 10) bins with the same population
+
+    min/max, sigma and n are exact; IQR, quantiles and the Knuth choice use the sample
+    (see Summary and rank_error). The last edge is just above the max value,
+    so it is not sent to the overflow.
+    """
+    summary = source if isinstance(source, Summary) else summarize(source, sample_size, chunk_size, seed)
+
+    if summary.n == 0:
+        raise ValueError('no finite values to compute the binning')
+
+    vmin, vmax = summary.vmin, np.nextafter(summary.vmax, np.inf)
+
+    if method == 'quantile':
+        q = np.linspace(0, 1, (nbins or 10) + 1)[1:-1]
+        edges = np.concatenate([[vmin], summary.quantile(q), [vmax]])
+        return np.unique(edges)
+
+    if nbins is None:
+        if method == 'fd':
+            q1, q3 = summary.quantile([0.25, 0.75])
+            nbins = _nbins_from_width(summary, 2. * (q3 - q1) / summary.n**(1./3), max_bins)
+        elif method == 'scott':
+            nbins = _nbins_from_width(summary, 3.49 * summary.std / summary.n**(1./3), max_bins)
+        elif method == 'knuth':
+            nbins = _knuth_nbins(summary, max_bins)
+        else:
+            raise ValueError('unknown binning method: %s' % method)
+
+    return np.linspace(vmin, vmax, nbins+1)
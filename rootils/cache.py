@@ -0,0 +1,158 @@
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+from collections import OrderedDict
+
+import ROOT
+
+
+def _default_path():
+    return os.environ.get('ROOTILS_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'rootils'))
+
+
+def _dir_size(path):
+    return sum([ os.path.getsize(os.path.join(path, fn)) for fn in os.listdir(path) ])
+
+
+class TreeCache(object):
+    """
+    On-disk cache of TTree branches (after an optional selection), stored as
+    .npy files and returned as read-only memmaps, so repeated reads of the
+    same branches only cost the page cache:
+
+        cache = TreeCache()
+        data = cache.get('file.root', 'tree', ['pt', 'eta'], 'pt > 20')
+        hists(data, ['pt', 'eta'])
+
+    Entries are keyed by the files (path, size and modification time), tree name,
+    branches and selection. When the cache is larger than max_size (bytes),
+    the least recently used entries are removed.
+    """
+
+    def __init__(self, path=None, max_size=10*1024**3):
+        self.path = path or _default_path()
+        self.max_size = max_size
+
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+    def key(self, files, tree_name, branches, selection=''):
+
+        if isinstance(files, str):
+            files = [files,]
+
+        identity = []
+        for fn in files:
+            st = os.stat(fn)
+            identity.append((os.path.realpath(fn), st.st_size, st.st_mtime_ns))
+
+        text = json.dumps([identity, tree_name, list(branches), selection])
+
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    def get(self, files, tree_name, branches, selection=''):
+        """
+        Return an OrderedDict branch -> memmap, reading the tree only the first time
+        """
+        if isinstance(files, str):
+            files = [files,]
+        if isinstance(branches, str):
+            branches = [branches,]
+
+        entry = os.path.join(self.path, self.key(files, tree_name, branches, selection))
+
+        if os.path.isdir(entry):
+            # mark as recently used
+            os.utime(entry, None)
+        else:
+            self._write(entry, files, tree_name, branches, selection)
+            self.evict(keep=entry)
+
+        return OrderedDict([ (name, np.load(os.path.join(entry, '%i.npy' % i), mmap_mode='r'))
+                             for i, name in enumerate(branches) ])
+
+    def _write(self, entry, files, tree_name, branches, selection):
+
+        chain = ROOT.TChain(tree_name)
+        for fn in files:
+            chain.Add(fn)
+
+        df = ROOT.RDataFrame(chain)
+        if selection:
+            df = df.Filter(selection)
+
+        columns = df.AsNumpy(list(branches))
+
+        # write in a temporary dir and rename, so readers never see partial entries
+        tmp = '%s.tmp%i' % (entry, os.getpid())
+        os.makedirs(tmp)
+
+        for i, name in enumerate(branches):
+            values = columns[name]
+            if values.dtype == object:
+                shutil.rmtree(tmp)
+                raise TypeError('only scalar branches can be cached (%s)' % name)
+            np.save(os.path.join(tmp, '%i.npy' % i), values)
+
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump({'files': files, 'tree': tree_name, 'branches': list(branches), 'selection': selection}, f)
+
+        try:
+            os.rename(tmp, entry)
+        except OSError:
+            # written at the same time by another process
+            shutil.rmtree(tmp)
+
+    def entries(self):
+        """
+        (path, size, last use) of each entry, least recently used first
+        """
+        entries = []
+        for fn in os.listdir(self.path):
+            path = os.path.join(self.path, fn)
+            if '.tmp' in fn or not os.path.isdir(path):
+                continue
+            entries.append((path, _dir_size(path), os.path.getmtime(path)))
+
+        return sorted(entries, key=lambda e: e[2])
+
+    def size(self):
+        return sum([ size for _, size, _ in self.entries() ])
+
+    def evict(self, keep=None):
+        """
+        Remove the least recently used entries until the cache fits in max_size
+        """
+        entries = self.entries()
+        total = sum([ size for _, size, _ in entries ])
+
+        for path, size, _ in entries:
+            if total <= self.max_size:
+                break
+            if path == keep:
+                continue
+            # open memmaps keep working, the data is freed when they are closed
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        for path, _, _ in self.entries():
+            shutil.rmtree(path, ignore_errors=True)
+
+
+_default_cache = None
+
+def read_branches(files, tree_name, branches, selection='', cache=None):
+    """
+    Branches of a tree as memmaps, using cache (or a TreeCache in $ROOTILS_CACHE)
+    """
+    global _default_cache
+
+    if cache is None:
+        if _default_cache is None:
+            _default_cache = TreeCache()
+        cache = _default_cache
+
+    return cache.get(files, tree_name, branches, selection)
@@ -0,0 +1,288 @@
+import numbers
+from array import array
+
+import numpy as np
+
+import rootils.utils as ut
+
+
+def _edges(nbins, vmin, vmax, edges):
+    if edges is not None:
+        return np.asarray(edges, dtype='float64')
+    return np.linspace(vmin, vmax, nbins+1)
+
+
+def _binning(edges):
+    """
+    (nbins, min, max, edges) for to_root, edges is None if the bins are uniform
+    """
+    nbins = len(edges) - 1
+    uniform = np.linspace(edges[0], edges[-1], nbins+1)
+    if np.allclose(edges, uniform, rtol=0, atol=1e-9 * (edges[-1] - edges[0]) / nbins):
+        return nbins, edges[0], edges[-1], None
+    return nbins, edges[0], edges[-1], edges
+
+
+def _rebin_axis(values, edges, new_edges, axis):
+    """
+    Sum the cells of values along axis into new_edges (a subset of edges).
+    Bins outside new_edges go to the underflow/overflow
+    """
+    new_edges = np.asarray(new_edges, dtype='float64')
+
+    idx = np.searchsorted(edges, new_edges)
+    if np.any(idx >= len(edges)) or not np.array_equal(edges[idx], new_edges):
+        raise ValueError('new edges must be a subset of the current edges')
+
+    starts = np.concatenate([[0], idx + 1])
+
+    return np.add.reduceat(values, starts, axis=axis)
+
+
+class Hist(object):
+    """
+    Histogram backed by NumPy arrays, with no ROOT objects involved until to_root().
+
+    - edges: tuple with the bin edges of each axis (1 or 2 axes)
+    - sumw, sumw2: sum of weights and squared weights, flow bins included,
+      indexed as [binx] or [binx, biny] using ROOT bin numbers
+    - entries: number of fills
+    - stats: the fill statistics of the in-range entries, as TH1::GetStats
+      ([sumw, sumw2, sumwx, sumwx2] + [sumwy, sumwy2, sumwxy] in 2D), or None
+      if unknown (to_root then computes them from the bin centers)
+    """
+
+    __slots__ = ('edges', 'sumw', 'sumw2', 'entries', 'stats')
+
+    def __init__(self, edges, sumw=None, sumw2=None, entries=0, stats=None):
+
+        if isinstance(edges, np.ndarray) and edges.ndim == 1:
+            edges = (edges,)
+        self.edges = tuple(np.asarray(e, dtype='float64') for e in edges)
+
+        shape = tuple(len(e)+1 for e in self.edges)
+
+        self.sumw  = np.zeros(shape) if sumw is None else np.asarray(sumw, dtype='float64')
+        self.sumw2 = self.sumw.copy() if sumw2 is None else np.asarray(sumw2, dtype='float64')
+        self.entries = entries
+
+        if stats is None and sumw is None:
+            stats = np.zeros(7 if len(self.edges) == 2 else 4)
+        self.stats = None if stats is None else np.array(stats, dtype='float64')
+
+    @classmethod
+    def from_array(cls, x, y=None, w=None, nx=100, xmin=None, xmax=None, xbins=None,
+                   ny=100, ymin=None, ymax=None, ybins=None):
+        """
+        Same arguments as array_to_hist/array_to_hist2d (event mode)
+        """
+        if xbins is None and (xmin is None or xmax is None):
+            nx, xmin, xmax = ut.guess_binning(x)
+
+        edges = [_edges(nx, xmin, xmax, xbins),]
+
+        if y is not None:
+            if ybins is None and (ymin is None or ymax is None):
+                ny, ymin, ymax = ut.guess_binning(y)
+            edges.append(_edges(ny, ymin, ymax, ybins))
+
+        return cls(edges).fill(x, y, w)
+
+    @classmethod
+    def from_stream(cls, stream):
+        edges = [_edges(*stream.xbinning),]
+        shape = (stream.xbinning[0]+2,)
+        if stream.is_2d:
+            edges.append(_edges(*stream.ybinning))
+            shape = (stream.ybinning[0]+2,) + shape
+
+        # stream cells are in ROOT global bin order
+        sumw  = stream.sumw.reshape(shape).T.copy()
+        sumw2 = stream.sumw2.reshape(shape).T.copy()
+
+        return cls(edges, sumw, sumw2, stream.entries, stream.stats)
+
+    @classmethod
+    def from_root(cls, hist):
+
+        axes = [hist.GetXaxis(),]
+        if hist.InheritsFrom('TH2'):
+            axes.append(hist.GetYaxis())
+
+        edges = [ _edges(*ut.axis_binning(axis)) for axis in axes ]
+        shape = tuple(len(e)+1 for e in reversed(edges))
+
+        sumw = ut.hist_buffer(hist).astype('float64')
+        if hist.GetSumw2N() > 0:
+            sumw2 = ut.buffer_to_array(hist.GetSumw2().GetArray(), hist.GetNcells()).copy()
+        else:
+            sumw2 = np.abs(sumw)
+
+        stats = array('d', [0.]*13)
+        hist.GetStats(stats)
+
+        return cls(edges, sumw.reshape(shape).T, sumw2.reshape(shape).T, hist.GetEntries(),
+                   stats[:7 if len(edges) == 2 else 4])
+
+    @property
+    def ndim(self):
+        return len(self.edges)
+
+    @property
+    def values(self):
+        return self.sumw[(slice(1, -1),) * self.ndim]
+
+    @property
+    def errors(self):
+        return np.sqrt(self.sumw2[(slice(1, -1),) * self.ndim])
+
+    def fill(self, x, y=None, w=None):
+
+        x = np.asarray(x, dtype='float64').ravel()
+        if w is not None:
+            w = np.asarray(w, dtype='float64').ravel()
+
+        ex = self.edges[0]
+        bins, inside = ut.find_bins(x, len(ex)-1, ex[0], ex[-1], ex)
+
+        if self.ndim == 2:
+            y = np.asarray(y, dtype='float64').ravel()
+            ey = self.edges[1]
+            binsy, insidey = ut.find_bins(y, len(ey)-1, ey[0], ey[-1], ey)
+            bins = bins * (len(ey)+1) + binsy
+            inside &= insidey
+
+        if self.stats is not None:
+            wi = w[inside] if w is not None else None
+            if self.ndim == 2:
+                self.stats += ut.fill_stats2d(x[inside], y[inside], wi)
+            else:
+                self.stats += ut.fill_stats(x[inside], wi)
+
+        sumw, sumw2 = ut.bin_sums(bins, w, self.sumw.size)
+
+        self.sumw  += sumw.reshape(self.sumw.shape)
+        self.sumw2 += sumw2.reshape(self.sumw.shape)
+        self.entries += len(x)
+
+        return self
+
+    def copy(self):
+        return Hist(self.edges, self.sumw.copy(), self.sumw2.copy(), self.entries, self.stats)
+
+    def _check_compatible(self, other):
+        if len(self.edges) != len(other.edges) or \
+           not all(np.array_equal(a, b) for a, b in zip(self.edges, other.edges)):
+            raise ValueError('histograms with different binning')
+
+    def __iadd__(self, other):
+        self._check_compatible(other)
+        self.sumw  += other.sumw
+        self.sumw2 += other.sumw2
+        self.entries += other.entries
+        if self.stats is None or other.stats is None:
+            self.stats = None
+        else:
+            self.stats += other.stats
+        return self
+
+    def __add__(self, other):
+        return self.copy().__iadd__(other)
+
+    def scale(self, c):
+        """
+        In-place scale, as TH1::Scale
+        """
+        self.sumw  *= c
+        self.sumw2 *= c * c
+        if self.stats is not None:
+            self.stats *= c
+            self.stats[1] *= c
+        return self
+
+    def __mul__(self, c):
+        return self.copy().scale(c)
+
+    __rmul__ = __mul__
+
+    def rebin(self, x=None, y=None):
+        """
+        Merge bins: x/y can be an integer factor or the new edges (a subset of the current ones)
+        """
+        h = self.copy()
+
+        for axis, new in enumerate((x, y)):
+            if new is None:
+                continue
+
+            edges = h.edges[axis]
+            if isinstance(new, numbers.Integral):
+                if (len(edges) - 1) % new != 0:
+                    raise ValueError('%i bins cannot be merged by %i' % (len(edges)-1, new))
+                new = edges[::new]
+
+            # entries moved to the flow bins are no longer in the stats
+            if new[0] != edges[0] or new[-1] != edges[-1]:
+                h.stats = None
+
+            h.sumw  = _rebin_axis(h.sumw, edges, new, axis)
+            h.sumw2 = _rebin_axis(h.sumw2, edges, new, axis)
+            h.edges = h.edges[:axis] + (np.asarray(new, dtype='float64'),) + h.edges[axis+1:]
+
+        return h
+
+    def __getitem__(self, key):
+        """
+        Slice in bin indices (0 is the first bin). The bins left out go to the flow bins
+        """
+        if not isinstance(key, tuple):
+            key = (key,)
+
+        new_edges = []
+        for k, edges in zip(key, self.edges):
+            if not isinstance(k, slice) or k.step not in (None, 1):
+                raise IndexError('only contiguous slices are supported')
+            start, stop, _ = k.indices(len(edges)-1)
+            new_edges.append(edges[start:stop+1])
+
+        return self.rebin(*new_edges)
+
+    def project(self, axis=0):
+        """
+        Projection of a 2D histogram on axis (0: x, 1: y), summing all the
+        bins of the other axis, as TH2::ProjectionX/Y
+        """
+        other = 1 - axis
+
+        # the stats only have the entries inside the other axis range
+        stats = None
+        flow = self.sumw.take([0, -1], axis=other)
+        if self.stats is not None and not flow.any():
+            stats = self.stats[[0, 1, 2, 3] if axis == 0 else [0, 1, 4, 5]]
+
+        return Hist((self.edges[axis],), self.sumw.sum(axis=other), self.sumw2.sum(axis=other), self.entries, stats)
+
+    def to_root(self):
+        """
+        Create the TH1D/TH2D with this content, entries and stats
+        (fixed size bins if the edges are uniform)
+        """
+        if self.ndim == 2:
+            nx, xmin, xmax, xbins = _binning(self.edges[0])
+            ny, ymin, ymax, ybins = _binning(self.edges[1])
+            hist = ut.create_TH2(nx, xmin, xmax, ny, ymin, ymax, xbins, ybins, double=True)
+        else:
+            hist = ut.create_TH1(*_binning(self.edges[0]), double=True)
+
+        # ROOT global bin = binx + (nx+2)*biny
+        hist.SetContent(np.ascontiguousarray(self.sumw.T).ravel())
+        if hist.GetSumw2N() == 0:
+            hist.Sumw2()
+        hist.GetSumw2().Set(hist.GetNcells(), np.ascontiguousarray(self.sumw2.T).ravel())
+        if self.stats is not None:
+            hist.PutStats(array('d', self.stats))
+        else:
+            hist.ResetStats()
+        hist.SetEntries(self.entries)
+
+        return hist
@@ -3,11 +3,14 @@ import numpy as np
 import pandas as pd
 
 import rootils.utils as ut
+import rootils.registry as registry
+from rootils.hist import Hist
 
 ROOT.PyConfig.IgnoreCommandLineOptions = True
 ROOT.gROOT.SetBatch(True)
 
 
+@registry.managed
 def lines(data=None,
           x=[],
           y=[],
@@ -23,19 +26,30 @@ def lines(data=None,
           lstyle=[],
           legend=False,
           legend_pos='top_right',
+          downsample=None,
+          npoints=800,
           save=None):
 
     """
     Input:
     - data: pandas.DataFrame, x: list of columns or column, y: list of columns
+    - data: dict of arrays/memmaps (e.g. TreeCache.get), as a DataFrame
     - data: None, x: list of array, y: list of arrays
     - data: list of TGraph, x/y: None
     - tree
+
+    downsample: 'lttb' or 'minmax' to draw only ~npoints points per series
+    (npoints ~ canvas width in pixels), for series with many points
     """
 
+    def to_graph(xs, ys):
+        if downsample:
+            xs, ys = ut.downsample(xs, ys, npoints, downsample)
+        return ut.array_to_graph(xs, ys)
+
     graphs = []
 
-    if isinstance(data, pd.DataFrame):
+    if isinstance(data, (pd.DataFrame, dict)):
         #data = daxta.copy(deep=True)
 
         if not isinstance(y, list):
@@ -48,7 +62,7 @@ def lines(data=None,
             data[x] = [ float(i+1) for i in range(len(data)) ]
 
         for i in range(n_lines):
-            g = ut.array_to_graph(data[x].values, data[y[i]].values)
+            g = to_graph(_column(data, x), _column(data, y[i]))
             graphs.append(g)
 
     elif isinstance(data, list):
@@ -58,9 +72,9 @@ def lines(data=None,
         n_lines = len(y)
         for i in range(n_lines):
             if isinstance(x, list) and isinstance(x[0], list):
-                g = ut.array_to_graph(x[i], y[i])
+                g = to_graph(x[i], y[i])
             else:
-                g = ut.array_to_graph(x, y[i])
+                g = to_graph(x, y[i])
             graphs.append(g)
 
 
@@ -87,6 +101,46 @@ def lines(data=None,
     return canvas
 
 
+def _column(data, name):
+    # dict columns (e.g. TreeCache memmaps) are used as they are, without copies
+    if isinstance(data, dict):
+        return data[name]
+    return data[name].values
+
+
+def _get_hists(data, x, bins, selection='', weight=None, n_threads=0):
+
+    if isinstance(data, list):
+        return [ h.to_root() if isinstance(h, Hist) else h for h in data ]
+
+    if not isinstance(x, list):
+        x = [x,]
+
+    binning = None if bins is True else bins
+
+    if isinstance(data, ROOT.TTree):
+        return ut.tree_to_hists(data, x, selection, weight, binning, n_threads)
+
+    if isinstance(data, (pd.DataFrame, dict)):
+        hists = []
+        for col in x:
+            values = _column(data, col)
+            w = _column(data, weight) if weight is not None else None
+            if binning is None:
+                nx, xmin, xmax = ut.guess_binning(values)
+                hist = ut.array_to_hist(values, nx, xmin, xmax, w=w)
+            elif isinstance(binning, tuple):
+                hist = ut.array_to_hist(values, *binning, w=w)
+            else:
+                hist = ut.array_to_hist(values, xbins=binning, w=w)
+            hist.SetName('h_%s' % col)
+            hists.append(hist)
+        return hists
+
+    return []
+
+
+@registry.managed
 def hists(data,
           x=[],
           bins=True,
@@ -104,25 +158,26 @@ def hists(data,
           legend=True,
           legend_pos='top_right',
           grid=False,
+          selection='',
+          weight=None,
+          n_threads=0,
           save=False):
 
     """
     Input:
     - data: pandas.DataFrame, x: list of columns or column
+    - data: dict of arrays/memmaps (e.g. TreeCache.get), x: list of keys or key
     - data: numpy array
-    - data: list of TH1, x: None
-    - data: tree or list of trees, x: list of branch name
+    - data: list of TH1 or Hist, x: None
+    - data: tree or chain, x: list of branch names or expressions
+      (all filled in one multi-threaded pass, with selection and weight,
+      see utils.tree_to_hists for n_threads)
+    bins: True for automatic binning, (nx, xmin, xmax) or bin edges
     """
 
-    hists = []
-    if isinstance(data, pd.DataFrame):
-        pass
-
-
-    elif isinstance(data, ROOT.TTree):
-        pass
-    elif isinstance(data, list):
-        hists = data
+    hists = _get_hists(data, x, bins, selection, weight, n_threads)
+    if not labels and x:
+        labels = x if isinstance(x, list) else [x,]
 
     # if bins:
     #     if isinstance(x, list) is False:
@@ -164,6 +219,7 @@ def hists(data,
     return canvas
 
 
+@registry.managed
 def hists_ratio(data,
                 x=[],
                 bins=True,
@@ -180,25 +236,26 @@ def hists_ratio(data,
                 text=None,
                 legend=True,
                 legend_pos='top_right',
+                selection='',
+                weight=None,
+                n_threads=0,
                 save=False):
 
     """
     Input:
     - data: pandas.DataFrame, x: list of columns or column
+    - data: dict of arrays/memmaps (e.g. TreeCache.get), x: list of keys or key
     - data: numpy array
-    - data: list of TH1, x: None
-    - data: tree or list of trees, x: list of branch name
+    - data: list of TH1 or Hist, x: None
+    - data: tree or chain, x: list of branch names or expressions
+      (all filled in one multi-threaded pass, with selection and weight,
+      see utils.tree_to_hists for n_threads)
+    bins: True for automatic binning, (nx, xmin, xmax) or bin edges
     """
 
-    hists = []
-    if isinstance(data, pd.DataFrame):
-        pass
-
-
-    elif isinstance(data, ROOT.TTree):
-        pass
-    elif isinstance(data, list):
-        hists = data
+    hists = _get_hists(data, x, bins, selection, weight, n_threads)
+    if not labels and x:
+        labels = x if isinstance(x, list) else [x,]
 
     # if bins:
     #     if isinstance(x, list) is False:
@@ -239,7 +296,7 @@ def hists_ratio(data,
     # Ratios
     ratios = []
     for hist in hists[1:]:
-        ratio = hist.Clone(hist.GetName()+'_ratio')
+        ratio = registry.track(hist.Clone(hist.GetName()+'_ratio'))
         ratio.Divide(hists[0])
         ratios.append(ratio)
 
@@ -257,6 +314,7 @@ def hists_ratio(data,
     return canvas
 
 
+@registry.managed
 def corr(data,
          corr_method='spearman',
          annot=False,
@@ -309,6 +367,7 @@ def corr(data,
     return canvas
 
 
+@registry.managed
 def heatmap():
 
     #
@@ -348,6 +407,7 @@ def heatmap():
     return canvas
 
 
+@registry.managed
 def confusion_matrix(tp, tn, fp, fn, norm=False, save=False):
 
     hist = ut.create_TH2(2, 0, 2, 2, 0, 2)
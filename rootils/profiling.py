@@ -0,0 +1,303 @@
+import os
+import sys
+import time
+import types
+import resource
+import functools
+import tracemalloc
+from collections import OrderedDict
+
+_default_targets = [
+    ('rootils.utils', ['array_to_hist', 'array_to_hist2d', 'array_to_graph', 'tree_to_hists',
+                       'guess_binning', 'downsample', 'sort_graph',
+                       'set_style_all', 'set_titles_labels', 'set_axis_limits', 'set_ratio_axis_limits',
+                       'legend', 'draw_text', 'create_canvas', 'create_canvas_with_ratio', 'footer']),
+    ('rootils.stream', ['stream_to_hist', 'fill_parallel']),
+    ('rootils.plots', ['_get_hists', 'lines', 'hists', 'hists_ratio', 'corr', 'confusion_matrix']),
+]
+
+# without sys.monitoring (python < 3.12), the methods of these classes are wrapped to count the ROOT calls
+_root_classes = ['TObject', 'TNamed', 'TAttLine', 'TAttFill', 'TAttMarker', 'TAttText', 'TAttAxis', 'TAxis',
+                 'TH1', 'TH2', 'TGraph', 'TVirtualPad', 'TPad', 'TCanvas', 'TLegend', 'TLatex', 'TText', 'TLine',
+                 'TStyle', 'TDirectory', 'TFile', 'TTree', 'TImage']
+
+
+_python_methods = (types.FunctionType, staticmethod, classmethod)
+
+
+def _is_cppyy(obj):
+    # cppyy functions/overloads (module cppyy), ROOT classes and instances (cppyy.gbl)
+    return type(obj).__module__ in ('cppyy', 'cppyy.gbl')
+
+
+def _is_root_call(func):
+    """
+    True for C++ functions and methods, ROOT class constructors and the pythonized
+    methods (plain python methods bound to a ROOT object or class, e.g. h.Fill, TFile.Open)
+    """
+    return _is_cppyy(func) or _is_cppyy(getattr(func, '__self__', None))
+
+
+class _Counted(object):
+    """
+    Class attribute that counts the calls of the wrapped method
+    """
+
+    def __init__(self, profiler, func):
+        self.profiler = profiler
+        self.func = func
+
+    def __get__(self, obj, cls=None):
+        method = self.func.__get__(obj, cls)
+        # C++ methods taken from the class (e.g. copied by the pythonizations of
+        # classes loaded meanwhile) stay unbound and are not counted
+        if obj is None and not isinstance(self.func, (staticmethod, classmethod)):
+            return method
+        return functools.partial(self.profiler._root_call, method)
+
+
+class Stage(object):
+
+    __slots__ = ('calls', 'total', 'self_time', 'root_calls', 'peak')
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.
+        self.self_time = 0.
+        self.root_calls = 0
+        self.peak = 0
+
+    def as_dict(self):
+        return OrderedDict([ (k, getattr(self, k)) for k in self.__slots__ ])
+
+
+class Profiler(object):
+    """
+    Opt-in instrumentation of the rootils functions (conversion, styling,
+    canvas, save, and the plots functions):
+
+        with Profiler() as prof:
+            plots.hists(df, ['pt'], save='pt.pdf')
+        prof.summary()
+
+    The functions are only wrapped inside the with block (and restored on exit),
+    so there is no cost when it is not used. Each stage records the number of calls,
+    the total and self wall time (the self time of plots.* is mostly drawing),
+    the PyROOT calls and, with memory=True, the peak of python/numpy memory.
+    Stats accumulate over all the calls (and over several with blocks).
+    With python >= 3.12 all the PyROOT calls are counted; before, only the calls
+    to the methods of the ROOT classes used by rootils (see _root_classes).
+    callback(name, seconds) is called after each instrumented call.
+    """
+
+    def __init__(self, memory=False, callback=None, targets=None):
+        self.memory = memory
+        self.callback = callback
+
+        self.targets = []
+        for module, names in (_default_targets if targets is None else targets):
+            __import__(module)
+            self.add(vars(sys.modules[module]), names, module.split('.')[-1])
+
+        self.stats = OrderedDict()
+        self.stack = []
+        self.root_calls = 0
+        self.root_depth = 0
+        self.counting = False
+        self.monitoring = False
+        self.tracing = False
+        self._patched = []
+        self._patched_root = []
+
+    def add(self, namespace, names, prefix):
+        """
+        Also instrument the functions names of namespace (a module dict or globals())
+        """
+        self.targets.append((namespace, names, prefix))
+
+    # stages
+    def _enter(self):
+        frame = [time.perf_counter(), 0., self.root_calls, 0, 0]
+
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self.stack:
+                self.stack[-1][3] = max(self.stack[-1][3], peak)
+            tracemalloc.reset_peak()
+            frame[4] = current
+
+        self.stack.append(frame)
+
+    def _exit(self, name):
+        start, child_time, root_calls, child_peak, mem_start = self.stack.pop()
+        elapsed = time.perf_counter() - start
+
+        stage = self.stats.get(name)
+        if stage is None:
+            stage = self.stats[name] = Stage()
+
+        stage.calls += 1
+        stage.total += elapsed
+        stage.self_time += elapsed - child_time
+        stage.root_calls += self.root_calls - root_calls
+
+        if self.memory:
+            peak = max(tracemalloc.get_traced_memory()[1], child_peak)
+            stage.peak = max(stage.peak, peak - mem_start)
+            if self.stack:
+                self.stack[-1][3] = max(self.stack[-1][3], peak)
+
+        if self.stack:
+            self.stack[-1][1] += elapsed
+
+        if self.callback is not None:
+            self.callback(name, elapsed)
+
+    def _wrap(self, name, func):
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            self._enter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._exit(name)
+
+        return wrapper
+
+    # PyROOT calls, counted with sys.monitoring (python >= 3.12)
+    def _on_call(self, code, offset, func, arg0):
+        # calls made by the pythonizations are part of the pythonized call
+        if code.co_filename.startswith(self._root_dirs):
+            return
+        if _is_root_call(func):
+            self.root_calls += 1
+
+    def _start_monitoring(self):
+        mon = getattr(sys, 'monitoring', None)
+        if mon is None:
+            return False
+        try:
+            mon.use_tool_id(mon.PROFILER_ID, 'rootils')
+        except ValueError:
+            # used by another profiler
+            return False
+
+        import ROOT, cppyy
+        self._root_dirs = tuple([ os.path.dirname(m.__file__) + os.sep for m in (ROOT, cppyy) ])
+
+        mon.register_callback(mon.PROFILER_ID, mon.events.CALL, self._on_call)
+        mon.set_events(mon.PROFILER_ID, mon.events.CALL)
+        return True
+
+    def _stop_monitoring(self):
+        mon = sys.monitoring
+        mon.set_events(mon.PROFILER_ID, 0)
+        mon.register_callback(mon.PROFILER_ID, mon.events.CALL, None)
+        mon.free_tool_id(mon.PROFILER_ID)
+
+    # or with the methods of the main ROOT classes wrapped (python < 3.12)
+    def _root_call(self, func, *args, **kwargs):
+        # methods called by other wrapped methods (e.g. pythonizations) are not counted
+        if self.root_depth == 0:
+            self.root_calls += 1
+        self.root_depth += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.root_depth -= 1
+
+    def _wrap_root_classes(self):
+        import ROOT
+
+        # and their subclasses already loaded, which have their own pythonizations (e.g. TH1F.Fill)
+        classes = [ getattr(ROOT, name) for name in _root_classes ]
+        for cls in classes:
+            classes.extend([ sub for sub in cls.__subclasses__() if sub not in classes ])
+
+        for cls in classes:
+            # the methods are added to the class dict when they are first used
+            for name in dir(cls):
+                if name.startswith('_'):
+                    continue
+                try:
+                    getattr(cls, name)
+                except Exception:
+                    continue
+                # C++ methods and pythonizations (not data members, nested classes or templates)
+                attr = vars(cls).get(name)
+                if not (type(attr).__name__ == 'CPPOverload' or isinstance(attr, _python_methods)):
+                    continue
+                self._patched_root.append((cls, name, attr))
+                setattr(cls, name, _Counted(self, attr))
+
+    def _unwrap_root_classes(self):
+        for cls, name, attr in reversed(self._patched_root):
+            setattr(cls, name, attr)
+        self._patched_root = []
+
+    def __enter__(self):
+
+        # re-exported functions (e.g. rootils.hists) are wrapped too
+        package = vars(sys.modules['rootils'])
+
+        for namespace, names, prefix in self.targets:
+            for name in names:
+                func = namespace.get(name)
+                if func is None:
+                    continue
+                wrapper = self._wrap('%s.%s' % (prefix, name), func)
+                for ns in (namespace, package):
+                    for key, value in list(ns.items()):
+                        if value is func:
+                            self._patched.append((ns, key, func))
+                            ns[key] = wrapper
+
+        self.monitoring = self._start_monitoring()
+        if not self.monitoring and not hasattr(sys, 'monitoring'):
+            self._wrap_root_classes()
+        self.counting = self.monitoring or bool(self._patched_root)
+
+        if self.memory:
+            self.tracing = tracemalloc.is_tracing()
+            if not self.tracing:
+                tracemalloc.start()
+
+        return self
+
+    def __exit__(self, *exc):
+
+        for ns, key, func in reversed(self._patched):
+            ns[key] = func
+        self._patched = []
+
+        if self.monitoring:
+            self._stop_monitoring()
+        self._unwrap_root_classes()
+
+        if self.memory and not self.tracing:
+            tracemalloc.stop()
+
+        return False
+
+    def as_dict(self):
+        """
+        Stats by stage (e.g. to save as json)
+        """
+        return OrderedDict([ (name, stage.as_dict()) for name, stage in self.stats.items() ])
+
+    def summary(self, out=None):
+        """
+        Print a table with the stats of each stage, slowest first
+        """
+        out = out or sys.stdout
+
+        out.write('%-34s %7s %10s %10s %10s %11s %10s\n' % ('stage', 'calls', 'total [s]', 'self [s]', 'mean [ms]', 'ROOT calls', 'peak [MB]'))
+
+        for name, s in sorted(self.stats.items(), key=lambda item: -item[1].total):
+            root_calls = '%11i' % s.root_calls if self.counting else '%11s' % '-'
+            peak = '%10.1f' % (s.peak / 1024.**2) if self.memory else '%10s' % '-'
+            out.write('%-34s %7i %10.3f %10.3f %10.2f %s %s\n' % (name, s.calls, s.total, s.self_time, 1e3 * s.total / s.calls, root_calls, peak))
+
+        # kB on linux
+        out.write('peak RSS: %.1f MB\n' % (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.))
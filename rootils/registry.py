@@ -0,0 +1,213 @@
+import functools
+import itertools
+import contextlib
+from collections import Counter, defaultdict, deque
+
+import ROOT
+
+_counter = itertools.count()
+
+def unique_name(prefix):
+    return '%s_%i' % (prefix, next(_counter))
+
+
+def _alive(obj):
+    # proxies of objects deleted by ROOT (or released) point to null
+    return ROOT.addressof(obj) != 0
+
+
+def _delete(obj):
+    ROOT.SetOwnership(obj, True)
+    obj.__destruct__()
+
+
+class Registry(object):
+    """
+    Keep track of the ROOT objects created by rootils (canvases, pads, histograms,
+    graphs, legends, text) so they can be freed at a known point, instead of
+    living until the end of the process:
+
+        with Registry(pool_size=2):
+            for spec in specs:
+                plots.hists(..., save=...)
+                release()
+
+    release() deletes all the tracked objects (their python references become
+    invalid). Up to pool_size canvases per size are kept, cleared, to be reused
+    by the next create_canvas. Exiting the with block releases everything and
+    deletes the pool.
+
+    The objects created inside a plots function belong to that plot (see plot()).
+    Only the objects of the last max_plots plots are kept alive (None: all), and
+    with release_on_save=True footer() frees the objects of the plot after saving.
+    Objects created outside the plots functions (e.g. array_to_hist) and passed to
+    them are never freed by these two, only by release().
+    """
+
+    def __init__(self, pool_size=0, release_on_save=False, max_plots=None):
+        self.pool_size = pool_size
+        self.release_on_save = release_on_save
+        self.max_plots = max_plots
+
+        self.objects = []
+        self.plots = deque()
+        self.plot_objects = None
+        self.pool = defaultdict(list)
+        self.sizes = {}
+
+    def track(self, obj):
+        ROOT.SetOwnership(obj, False)
+        self.objects.append(obj)
+        if self.plot_objects is not None:
+            self.plot_objects.append(obj)
+        return obj
+
+    @contextlib.contextmanager
+    def plot(self):
+        """
+        The objects tracked inside this block are the objects of one plot
+        """
+        # plots functions called by other plots functions are part of the same plot
+        if self.plot_objects is not None:
+            yield
+            return
+
+        if self.max_plots is not None:
+            while self.plots and len(self.plots) >= self.max_plots:
+                self._release(self.plots.popleft())
+
+        self.plot_objects = []
+        self.plots.append(self.plot_objects)
+        try:
+            yield
+        finally:
+            self.plot_objects = None
+
+    def release_plot(self):
+        """
+        Delete the objects of the current (or last) plot
+        """
+        if not self.plots:
+            return
+
+        self._release(self.plots.pop())
+
+        # released from inside the plot (footer): what follows is still part of it
+        if self.plot_objects is not None:
+            self.plot_objects = []
+            self.plots.append(self.plot_objects)
+
+    def canvas(self, w, h):
+        """
+        A canvas from the pool, or a new one
+        """
+        pool = self.pool[(w, h)]
+        while pool:
+            canvas = pool.pop()
+            if _alive(canvas):
+                canvas.Clear()
+                canvas.cd()
+                return self.track(canvas)
+
+        canvas = ROOT.TCanvas(unique_name('canvas'), '', w, h)
+        self.sizes[ROOT.addressof(canvas)] = (w, h)
+
+        return self.track(canvas)
+
+    def release(self):
+        self.plots.clear()
+        if self.plot_objects is not None:
+            self.plot_objects = []
+            self.plots.append(self.plot_objects)
+
+        objects, self.objects = self.objects, []
+        self._release(objects)
+
+    def _release(self, objects):
+
+        released = set([ id(obj) for obj in objects ])
+        self.objects = [ obj for obj in self.objects if id(obj) not in released ]
+
+        # primitives first, so the canvases do not point to deleted objects
+        canvases = []
+        for obj in objects:
+            if not _alive(obj):
+                continue
+            if obj.InheritsFrom('TCanvas'):
+                canvases.append(obj)
+            else:
+                _delete(obj)
+
+        for canvas in canvases:
+            pool = self.pool[self.sizes.get(ROOT.addressof(canvas))]
+            if len(pool) < self.pool_size:
+                canvas.Clear()
+                pool.append(canvas)
+            else:
+                self.sizes.pop(ROOT.addressof(canvas), None)
+                _delete(canvas)
+
+    def clear_pool(self):
+        for pool in self.pool.values():
+            for canvas in pool:
+                if _alive(canvas):
+                    _delete(canvas)
+        self.pool.clear()
+        self.sizes.clear()
+
+    def counts(self):
+        """
+        Number of live objects by class (and canvases waiting in the pool)
+        """
+        counts = Counter([ obj.ClassName() for obj in self.objects if _alive(obj) ])
+
+        pooled = sum([ len(pool) for pool in self.pool.values() ])
+        if pooled:
+            counts['pooled canvases'] = pooled
+
+        return dict(counts)
+
+    def __enter__(self):
+        _stack.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        _stack.remove(self)
+        self.release()
+        self.clear_pool()
+        return False
+
+
+# as when every plot used a canvas named 'canvas': the previous plot is freed by the next one
+_default = Registry(max_plots=1)
+_stack = []
+
+def current():
+    """
+    Registry of the innermost with block, or the default (keeps only the last plot)
+    """
+    return _stack[-1] if _stack else _default
+
+
+def managed(func):
+    """
+    Decorator for the plots functions: the objects they create belong to one plot
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with current().plot():
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def track(obj):
+    return current().track(obj)
+
+
+def release():
+    current().release()
+
+
+def live_objects():
+    return current().counts()
@@ -0,0 +1,334 @@
+import os
+import shutil
+import tempfile
+import itertools
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import rootils.utils as ut
+
+
+def _binning(nbins, vmin, vmax, edges):
+    if edges is not None:
+        edges = np.asarray(edges, dtype='float64')
+        return len(edges)-1, edges[0], edges[-1], edges
+
+    if nbins is None or vmin is None or vmax is None:
+        raise ValueError('streaming needs the binning in advance (nbins, min, max or edges)')
+
+    return nbins, vmin, vmax, None
+
+
+class HistStream(object):
+    """
+    Fill one histogram incrementally, chunk by chunk, with bounded memory:
+
+        stream = HistStream(nx=100, xmin=0, xmax=1)
+        for chunk in chunks:
+            stream.update(chunk)
+        hist = stream.finalize()
+
+    The result is the same as filling everything at once with array_to_hist.
+    Passing the y binning makes a 2D stream, where chunks are (x, y) pairs or
+    (N, 2) arrays (same as array_to_hist2d).
+    """
+
+    def __init__(self, nx=100, xmin=None, xmax=None, xbins=None,
+                 ny=None, ymin=None, ymax=None, ybins=None, hist=None):
+
+        self.hist = hist
+
+        if hist is not None:
+            nx, xmin, xmax, xbins = ut.axis_binning(hist.GetXaxis())
+            if hist.InheritsFrom('TH2'):
+                ny, ymin, ymax, ybins = ut.axis_binning(hist.GetYaxis())
+
+        self.xbinning = _binning(nx, xmin, xmax, xbins)
+
+        self.ybinning = None
+        if ny is not None or ybins is not None:
+            self.ybinning = _binning(ny, ymin, ymax, ybins)
+
+        self.ncells = self.xbinning[0] + 2
+        if self.ybinning is not None:
+            self.ncells *= self.ybinning[0] + 2
+
+        self.reset()
+
+    @property
+    def is_2d(self):
+        return self.ybinning is not None
+
+    def reset(self):
+        self.sumw  = np.zeros(self.ncells)
+        self.sumw2 = np.zeros(self.ncells)
+        self.stats = np.zeros(7 if self.is_2d else 4)
+        self.entries = 0
+
+    @staticmethod
+    def _check_lengths(x, w, y=None):
+        for name, a in (('y', y), ('weights', w)):
+            if a is not None and len(a) != len(x):
+                raise ValueError('x and %s have different lengths (%i, %i)' % (name, len(x), len(a)))
+
+    def update(self, chunk, weights=None):
+
+        w = None
+        if weights is not None:
+            w = np.asarray(weights, dtype='float64').ravel()
+
+        if self.is_2d:
+            if isinstance(chunk, tuple):
+                x, y = chunk
+            else:
+                chunk = np.asarray(chunk)
+                x, y = chunk[:,0], chunk[:,1]
+
+            x = np.asarray(x, dtype='float64').ravel()
+            y = np.asarray(y, dtype='float64').ravel()
+
+            self._check_lengths(x, w, y)
+
+            binsx, insidex = ut.find_bins(x, *self.xbinning)
+            binsy, insidey = ut.find_bins(y, *self.ybinning)
+
+            bins = binsx + (self.xbinning[0] + 2) * binsy
+            inside = insidex & insidey
+
+            stats = ut.fill_stats2d(x[inside], y[inside], w[inside] if w is not None else None)
+
+        else:
+            x = np.asarray(chunk, dtype='float64').ravel()
+
+            self._check_lengths(x, w)
+
+            bins, inside = ut.find_bins(x, *self.xbinning)
+
+            stats = ut.fill_stats(x[inside], w[inside] if w is not None else None)
+
+        sumw, sumw2 = ut.bin_sums(bins, w, self.ncells)
+
+        self.sumw  += sumw
+        self.sumw2 += sumw2
+        self.stats += stats
+        self.entries += len(x)
+
+        return self
+
+    def merge(self, other):
+        """
+        Add the partial result of another stream with the same binning
+        """
+        if self.ncells != other.ncells or self.is_2d != other.is_2d:
+            raise ValueError('cannot merge streams with different binning')
+
+        self.sumw  += other.sumw
+        self.sumw2 += other.sumw2
+        self.stats += other.stats
+        self.entries += other.entries
+
+        return self
+
+    def __getstate__(self):
+        # partial results travel between workers without the ROOT histogram
+        state = self.__dict__.copy()
+        state['hist'] = None
+        return state
+
+    def finalize(self):
+        """
+        Move the accumulated sums into the histogram (a new one, or the one
+        given to the constructor) and return it
+        """
+        hist = self.hist
+        if hist is None:
+            nx, xmin, xmax, xbins = self.xbinning
+            if self.is_2d:
+                ny, ymin, ymax, ybins = self.ybinning
+                hist = ut.create_TH2(nx, xmin, xmax, ny, ymin, ymax, xbins, ybins)
+            else:
+                hist = ut.create_TH1(nx, xmin, xmax, xbins)
+
+        ut.add_hist_content(hist, self.sumw, self.sumw2, self.stats, self.entries)
+
+        self.reset()
+
+        return hist
+
+
+def iter_chunks(source, chunk_size=1000000):
+    """
+    Iterate over source in chunks of chunk_size entries.
+    source can be a path to a .npy file (memory-mapped, never fully loaded),
+    an array/memmap/pandas Series, or any iterable of chunks
+    (e.g. h5py/pytables slices, pyarrow record batches columns)
+    """
+    if isinstance(source, str):
+        source = np.load(source, mmap_mode='r')
+
+    if hasattr(source, 'to_numpy'):
+        source = source.to_numpy()
+
+    if isinstance(source, np.ndarray):
+        for i in range(0, len(source), chunk_size):
+            yield source[i:i+chunk_size]
+    else:
+        for chunk in source:
+            yield chunk
+
+
+def _iter_weighted_chunks(source, weights, chunk_size=1000000):
+    """
+    (chunk, weights chunk) pairs. Unlike zip, a different number of chunks
+    raises ValueError (HistStream.update checks the length of each chunk)
+    """
+    pairs = itertools.zip_longest(iter_chunks(source, chunk_size), iter_chunks(weights, chunk_size))
+    for chunk, w in pairs:
+        if chunk is None or w is None:
+            raise ValueError('source and weights have different lengths')
+        yield chunk, w
+
+
+def stream_to_hist(source, weights=None, chunk_size=1000000, **binning):
+    """
+    Histogram source chunk by chunk (see iter_chunks for the accepted inputs).
+    weights, if given, must be chunked in the same way as source.
+    binning: nx, xmin, xmax, xbins (and ny, ymin, ymax, ybins for 2D)
+    """
+    stream = HistStream(**binning)
+
+    if weights is None:
+        for chunk in iter_chunks(source, chunk_size):
+            stream.update(chunk)
+    else:
+        for chunk, w in _iter_weighted_chunks(source, weights, chunk_size):
+            stream.update(chunk, w)
+
+    return stream.finalize()
+
+
+def stream_fill(hist, source, weights=None, chunk_size=1000000):
+    """
+    Fill an existing hist with source chunk by chunk
+    """
+    stream = HistStream(hist=hist)
+
+    if weights is None:
+        for chunk in iter_chunks(source, chunk_size):
+            stream.update(chunk)
+    else:
+        for chunk, w in _iter_weighted_chunks(source, weights, chunk_size):
+            stream.update(chunk, w)
+
+    return stream.finalize()
+
+
+def merge_streams(streams):
+    """
+    Merge partial streams by pairs (tree reduction)
+    """
+    streams = list(streams)
+
+    while len(streams) > 1:
+        merged = [ a.merge(b) for a, b in zip(streams[0::2], streams[1::2]) ]
+        if len(streams) % 2:
+            merged.append(streams[-1])
+        streams = merged
+
+    return streams[0]
+
+
+def _fill_partial(xbinning, ybinning, chunk, w):
+
+    nx, xmin, xmax, xbins = xbinning
+    ny, ymin, ymax, ybins = ybinning if ybinning is not None else (None, None, None, None)
+
+    stream = HistStream(nx, xmin, xmax, xbins, ny, ymin, ymax, ybins)
+
+    return stream.update(chunk, w)
+
+
+# inputs of fill_parallel, inherited by the forked workers
+_shared = None
+
+def _fill_shared(xbinning, ybinning, i1, i2):
+
+    x, y, w = _shared
+    if isinstance(x, str):
+        # spilled to .npy files (no fork)
+        x, y, w = [ np.load(a, mmap_mode='r') if a is not None else None for a in (x, y, w) ]
+
+    chunk = x[i1:i2] if y is None else (x[i1:i2], y[i1:i2])
+
+    return _fill_partial(xbinning, ybinning, chunk, w[i1:i2] if w is not None else None)
+
+
+def _spill(arrays, tmp_dir):
+    paths = []
+    for i, a in enumerate(arrays):
+        if a is None:
+            paths.append(None)
+        else:
+            paths.append(os.path.join(tmp_dir, '%i.npy' % i))
+            np.save(paths[-1], a)
+    return paths
+
+
+def fill_parallel(hist, x, y=None, w=None, n_jobs=-1, backend='process'):
+    """
+    Fill hist splitting the input in n_jobs parts, filled in a process (or thread) pool
+    and merged with a tree reduction. n_jobs=-1 uses all the cpus.
+    The process workers are forked and read their part of the inputs from the
+    parent memory (without fork, from .npy memmaps), the inputs are not pickled.
+    Contents and errors are bit-identical to the serial fill for integer weights
+    """
+    global _shared
+
+    if n_jobs is None or n_jobs < 1:
+        n_jobs = os.cpu_count() or 1
+
+    x = np.asarray(x)
+    if y is not None:
+        y = np.asarray(y)
+    if w is not None:
+        w = np.asarray(w)
+
+    HistStream._check_lengths(x, w, y)
+
+    stream = HistStream(hist=hist)
+
+    edges = np.linspace(0, len(x), n_jobs+1).astype('int64')
+    ranges = list(zip(edges[:-1], edges[1:]))
+
+    if backend != 'process':
+        with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+            futures = []
+            for i1, i2 in ranges:
+                chunk = x[i1:i2] if y is None else (x[i1:i2], y[i1:i2])
+                wchunk = w[i1:i2] if w is not None else None
+                futures.append(pool.submit(_fill_partial, stream.xbinning, stream.ybinning, chunk, wchunk))
+            partials = [ f.result() for f in futures ]
+
+    else:
+        tmp_dir = None
+        if 'fork' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('fork')
+            _shared = (x, y, w)
+        else:
+            context = None
+            tmp_dir = tempfile.mkdtemp(prefix='rootils_fill')
+            _shared = tuple(_spill((x, y, w), tmp_dir))
+
+        try:
+            with ProcessPoolExecutor(max_workers=n_jobs, mp_context=context) as pool:
+                futures = [ pool.submit(_fill_shared, stream.xbinning, stream.ybinning, i1, i2) for i1, i2 in ranges ]
+                partials = [ f.result() for f in futures ]
+        finally:
+            _shared = None
+            if tmp_dir is not None:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    stream.merge(merge_streams(partials))
+
+    return stream.finalize()
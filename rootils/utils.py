@@ -1,8 +1,15 @@
+import os
 import sys
 import ROOT
 import math
+import atexit
+import shutil
+import tempfile
 import numpy as np
 from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+import rootils.registry as registry
 
 is_py3 = (sys.version_info > (3, 0))
 
@@ -213,8 +220,7 @@ def set_style(obj, **kwargs):
 
 
 def create_canvas(w=800, h=600, rightaxis=False, grid=False, logx=False, logy=False):
-    canvas = ROOT.TCanvas("canvas", "", w, h)
-    ROOT.SetOwnership(canvas, False)
+    canvas = registry.current().canvas(w, h)
 
     canvas.SetLeftMargin(0.12)
     canvas.SetBottomMargin(0.12)
@@ -224,23 +230,20 @@ def create_canvas(w=800, h=600, rightaxis=False, grid=False, logx=False, logy=Fa
     else:
         canvas.SetRightMargin(0.02)
     canvas.SetTicks()
-    if grid:
-        canvas.SetGrid()
-    if logy:
-        canvas.SetLogy()
-    if logx:
-        canvas.SetLogx()
+    # set always, the canvas can come from the pool
+    canvas.SetGrid(int(grid), int(grid))
+    canvas.SetLogy(int(logy))
+    canvas.SetLogx(int(logx))
 
     return canvas
 
 def create_canvas_with_ratio(w=800, h=600, rightaxis=False, grid=False, logx=False, logy=False):
     # TODO
 
-    canvas = ROOT.TCanvas("canvas", "", w, h)
-    ROOT.SetOwnership(canvas, False)
+    canvas = registry.current().canvas(w, h)
 
-    cup   = ROOT.TPad("u", "u", 0., 0.305, 0.99, 1)
-    cdn  = ROOT.TPad("d", "d", 0., 0.01, 0.99, 0.295)
+    cup  = registry.track(ROOT.TPad(registry.unique_name('u'), '', 0., 0.305, 0.99, 1))
+    cdn  = registry.track(ROOT.TPad(registry.unique_name('d'), '', 0., 0.01, 0.99, 0.295))
     cup.SetRightMargin(0.05)
     cup.SetBottomMargin(0.005)
 
@@ -276,6 +279,7 @@ def legend(objs, labels, pos='top_right', ncols=1):
         legend = ROOT.TLegend(0.65, 0.84, 0.94, 0.94)
     elif pos == 'bl'or pos == 'bottom_left':
         legend = ROOT.TLegend(0.15, 0.15, 0.45, 0.45)
+    registry.track(legend)
 
     legend.SetFillColor(0)
     legend.SetBorderSize(0)
@@ -287,10 +291,125 @@ def legend(objs, labels, pos='top_right', ncols=1):
     return legend
 
 
+_image_formats = ('png', 'gif', 'jpg', 'jpeg', 'tiff', 'bmp', 'xpm')
+
+class AsyncWriter(object):
+    """
+    Save canvases without waiting for the disk. Painting is not thread safe, so
+    the canvas is always painted in the calling thread:
+    - images (png, jpg, ...) are painted to an in-memory TImage, and a thread
+      pool encodes and writes the file
+    - other formats (pdf, svg, root, ...) are written by ROOT to a local temporary
+      dir, and the thread pool moves them to their destination
+    ROOT thread safety (ROOT.EnableThreadSafety) is enabled when it is created.
+    Errors are raised by flush()
+    """
+
+    def __init__(self, n_threads=2, tmp_dir=None):
+        # the writer threads use ROOT (TImage) while the main thread keeps drawing
+        ROOT.EnableThreadSafety()
+
+        self.pool = ThreadPoolExecutor(max_workers=n_threads)
+        self.tmp_dir = tempfile.mkdtemp(prefix='rootils', dir=tmp_dir)
+        self.futures = []
+        self.counter = 0
+
+    def save(self, canvas, path):
+        self.counter += 1
+        tmp = os.path.join(self.tmp_dir, '%i_%s' % (self.counter, os.path.basename(path)))
+
+        if os.path.splitext(path)[1][1:].lower() in _image_formats:
+            image = ROOT.TImage.Create()
+            ROOT.SetOwnership(image, True)
+            image.FromPad(canvas)
+            self.futures.append((path, self.pool.submit(self._write_image, image, tmp, path)))
+            return
+
+        canvas.SaveAs(tmp)
+
+        if not os.path.isfile(tmp):
+            raise IOError('could not save %s' % path)
+
+        self.futures.append((path, self.pool.submit(shutil.move, tmp, path)))
+
+    @staticmethod
+    def _write_image(image, tmp, path):
+        image.WriteImage(tmp)
+
+        if not os.path.isfile(tmp):
+            raise IOError('could not write the image')
+
+        shutil.move(tmp, path)
+
+    def flush(self):
+        """
+        Wait for all the pending files, raise an IOError with the ones that failed
+        """
+        futures, self.futures = self.futures, []
+
+        errors = []
+        for path, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                errors.append('%s: %s' % (path, e))
+
+        if errors:
+            raise IOError('could not write:\n' + '\n'.join(errors))
+
+    wait = flush
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.pool.shutdown()
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+_writer = None
+
+def async_save(n_threads=2, tmp_dir=None):
+    """
+    From now on, footer only paints the canvas, and the files are written in
+    the background (see AsyncWriter).
+    n_threads=0 goes back to synchronous saving
+    """
+    global _writer
+
+    if _writer is not None:
+        _writer.close()
+        _writer = None
+
+    if n_threads > 0:
+        _writer = AsyncWriter(n_threads, tmp_dir)
+        atexit.register(_writer.close)
+
+
+def flush():
+    """
+    Wait for the files saved in the background, raise if some failed
+    """
+    if _writer is not None:
+        _writer.flush()
+
+wait = flush
+
+
 def footer(canvas, save=False):
+    """
+    save: path or list of paths (e.g. ['plot.pdf', 'plot.png']), all written from the same drawing
+    """
     canvas.RedrawAxis()
     if save:
-        canvas.SaveAs(save)
+        for path in ([save,] if isinstance(save, str) else save):
+            if _writer is not None:
+                _writer.save(canvas, path)
+            else:
+                canvas.SaveAs(path)
+
+        if registry.current().release_on_save:
+            registry.current().release_plot()
 
 
 def set_axis_limits(objs, logx=False, logy=False):
@@ -403,30 +522,78 @@ def set_titles_labels(objs, xtitle, ytitle):
     objs[0].GetYaxis().SetTitle(ytitle)
 
 
-def sort_graph(g, sort_x=True):
-
-    ax = array('f', [])
-    ay = array('f', [])
-
-    d = dict()
-    for i in range(g.GetN()):
-
-        xtmp = ROOT.Double(0)
-        ytmp = ROOT.Double(0)
-
-        g.GetPoint(i, xtmp, ytmp)
-        d[xtmp] = ytmp
+_graph_columns = [
+    ('TGraphAsymmErrors', ('GetX', 'GetY', 'GetEXlow', 'GetEXhigh', 'GetEYlow', 'GetEYhigh')),
+    ('TGraphErrors',      ('GetX', 'GetY', 'GetEX', 'GetEY')),
+    ('TGraph',            ('GetX', 'GetY')),
+]
 
-    if sort_x:
-        for x, y in sorted(d.items()):
-            ax.append(x)
-            ay.append(y)
+def graph_to_arrays(g):
+    """
+    NumPy views (no copy) of the graph buffers: x, y and the errors if any
+    (ex, ey for TGraphErrors, exl, exh, eyl, eyh for TGraphAsymmErrors).
+    The views are only valid while g is alive
+    """
+    n = g.GetN()
+    for cls, getters in _graph_columns:
+        if g.InheritsFrom(cls):
+            return [ buffer_to_array(getattr(g, getter)(), n) for getter in getters ]
+
+
+def arrays_to_graph(columns):
+    """
+    TGraph, TGraphErrors or TGraphAsymmErrors depending on the number of columns
+    (2, 4 or 6, in the graph_to_arrays order)
+    """
+    columns = [ np.ascontiguousarray(c, dtype='float64') for c in columns ]
+    n = len(columns[0])
+
+    if len(columns) == 6:
+        cls = ROOT.TGraphAsymmErrors
+    elif len(columns) == 4:
+        cls = ROOT.TGraphErrors
     else:
-        for x, y in sorted(d, key=d.get):
-            ax.append(x)
-            ay.append(y)
+        cls = ROOT.TGraph
+
+    if n == 0:
+        return cls()
+
+    return cls(n, *columns)
+
+
+def sort_graph(g, sort_x=True, duplicates='keep'):
+    """
+    Sorted copy of the graph (TGraph, TGraphErrors or TGraphAsymmErrors), by x or by y.
+    Points with the same x:
+    - keep: keep all of them (in the original order)
+    - last: keep the last one
+    - mean: merge them in one point with the mean values (errors added in quadrature / n)
+    """
+    columns = graph_to_arrays(g)
+
+    idx = np.argsort(columns[0], kind='stable')
+    columns = [ c[idx] for c in columns ]
+
+    if duplicates != 'keep' and len(idx) > 0:
+        x = columns[0]
+        starts = np.flatnonzero(np.concatenate([[True], x[1:] != x[:-1]]))
+        counts = np.diff(np.append(starts, len(x)))
+
+        if duplicates == 'last':
+            last = starts + counts - 1
+            columns = [ c[last] for c in columns ]
+        elif duplicates == 'mean':
+            values = [ np.add.reduceat(c, starts) / counts for c in columns[:2] ]
+            errors = [ np.sqrt(np.add.reduceat(c*c, starts)) / counts for c in columns[2:] ]
+            columns = values + errors
+        else:
+            raise ValueError('unknown duplicates policy: %s' % duplicates)
+
+    if not sort_x:
+        idx = np.argsort(columns[1], kind='stable')
+        columns = [ c[idx] for c in columns ]
 
-    return ROOT.TGraph(g.GetN(), ax, ay)
+    return arrays_to_graph(columns)
 
 
 def draw_text(text, pos='top_right', size=0.03, ndc=True):
@@ -434,8 +601,7 @@ def draw_text(text, pos='top_right', size=0.03, ndc=True):
     if pos == 'top_right':
         x, y = 0.65, 0.75
 
-    l = ROOT.TLatex(x, y, text)
-    ROOT.SetOwnership(l, False)
+    l = registry.track(ROOT.TLatex(x, y, text))
     l.SetTextFont(42)
 
     if ndc:
@@ -449,7 +615,7 @@ def draw_text(text, pos='top_right', size=0.03, ndc=True):
 
 def draw_horizontal_line(y): # FIX
 
-    l = ROOT.TLine(0, 220, 200, 220)
+    l = registry.track(ROOT.TLine(0, 220, 200, 220))
     l.SetLineStyle(2)
     l.SetLineColor(ROOT.kGray+1)
     l.Draw()
@@ -473,6 +639,7 @@ def draw_ratio_lines(ratio):
     lines[2].SetLineStyle(3)
 
     for line in lines:
+        registry.track(line)
         line.AppendPad()
         line.Draw()
 
@@ -492,21 +659,21 @@ def set_default_hist_style(h):
     h.SetMarkerStyle(20)
 
 
-def create_TGraph(x, y):
-    g = ROOT.TGraph(len(x), x, y)
-    ROOT.SetOwnership(g, False)
+def create_TGraph(x, y, *errors):
+    g = registry.track(arrays_to_graph((x, y) + errors))
     set_default_graph_style(g)
     return g
 
-def create_TH1(nx=None, xmin=None, xmax=None, xbins=None):
-    name = 'h1'
-    if xbins:
-        hist = ROOT.TH1F(name, name, len(xbins)-1, array('d', xbins))
+def create_TH1(nx=None, xmin=None, xmax=None, xbins=None, double=False):
+    name = registry.unique_name('h1')
+    cls = ROOT.TH1D if double else ROOT.TH1F
+    if xbins is not None:
+        hist = cls(name, name, len(xbins)-1, array('d', xbins))
     elif nx is not None and xmin is not None and xmax is not None:
-        hist = ROOT.TH1F(name, name, nx, xmin, xmax)
+        hist = cls(name, name, nx, xmin, xmax)
 
     hist.SetDirectory(0)
-    ROOT.SetOwnership(hist, False)
+    registry.track(hist)
 
     hist.Sumw2()
     hist.SetStats(0)
@@ -515,57 +682,509 @@ def create_TH1(nx=None, xmin=None, xmax=None, xbins=None):
 
     return hist
 
-def create_TH2(nx, xmin, xmax, ny, ymin, ymax, xbins=None, ybins=None):
-    name = 'h2'
+def create_TH2(nx, xmin, xmax, ny, ymin, ymax, xbins=None, ybins=None, double=False):
+    name = registry.unique_name('h2')
+    cls = ROOT.TH2D if double else ROOT.TH2F
     if xbins is not None and ybins is not None:
-        hist = ROOT.TH2F(name, name, len(xbins)-1, array('d', xbins), len(ybins)-1, array('d', ybins))
+        hist = cls(name, name, len(xbins)-1, array('d', xbins), len(ybins)-1, array('d', ybins))
+    elif xbins is not None:
+        hist = cls(name, name, len(xbins)-1, array('d', xbins), ny, ymin, ymax)
+    elif ybins is not None:
+        hist = cls(name, name, nx, xmin, xmax, len(ybins)-1, array('d', ybins))
     else:
-        hist = ROOT.TH2F(name, name, nx, xmin, xmax, ny, ymin, ymax)
-    ROOT.SetOwnership(hist, False)
+        hist = cls(name, name, nx, xmin, xmax, ny, ymin, ymax)
+    registry.track(hist)
     hist.SetDirectory(0)
     hist.SetStats(0)
     set_default_hist_style(hist)
 
     return hist
 
-def array_to_graph(x, y=None):
+def _as_column(a):
+    # contiguous float64 buffer, without copy if it is already one (arrays, memmaps)
+    if hasattr(a, 'to_numpy'):
+        a = a.to_numpy()
+    return np.ascontiguousarray(a, dtype='float64')
+
+
+def _split_xy(data):
+
+    if hasattr(data, 'columns'):
+        return data.iloc[:,0], data.iloc[:,1]
+
+    data = np.asarray(data)
+
+    # structured array: x/y fields, or the first two
+    if data.dtype.names is not None:
+        names = data.dtype.names
+        if 'x' in names and 'y' in names:
+            return data['x'], data['y']
+        return data[names[0]], data[names[1]]
+
+    return data[:,0], data[:,1]
+
+
+def array_to_graph(x, y=None, ex=None, ey=None):
+    """
+    - x, y: arrays, memmaps, pandas columns
+    - x: (N, 2) array, structured array or 2 columns DataFrame, y: None
+    ex/ey: errors array for a TGraphErrors, or (low, high) arrays for a TGraphAsymmErrors
+    """
     if y is None:
-        ax = np.asarray([ z[0] for z in x ], 'float64')
-        ay = np.asarray([ z[1] for z in x ], 'float64')
+        x, y = _split_xy(x)
+
+    columns = [_as_column(x), _as_column(y)]
+
+    if ex is not None or ey is not None:
+        asymm = isinstance(ex, tuple) or isinstance(ey, tuple)
+        n = len(columns[0])
+        for e in (ex, ey):
+            if e is None:
+                e = np.zeros(n)
+            if asymm:
+                low, high = e if isinstance(e, tuple) else (e, e)
+                columns += [_as_column(low), _as_column(high)]
+            else:
+                columns.append(_as_column(e))
+
+    return create_TGraph(*columns)
+
+
+def downsample_minmax(x, y, n):
+    """
+    Keep the min and max y of each of n/2 buckets (plus first and last points)
+    """
+    npoints = len(x)
+    nbuckets = max(n // 2, 1)
+    size = -(-npoints // nbuckets)
+
+    # buckets as rows, padded to the same size
+    pad = nbuckets * size - npoints
+    rows_max = np.append(y, np.full(pad, -np.inf)).reshape(nbuckets, size)
+    rows_min = np.append(y, np.full(pad, np.inf)).reshape(nbuckets, size)
+
+    offsets = np.arange(nbuckets) * size
+    imax = offsets + np.argmax(rows_max, axis=1)
+    imin = offsets + np.argmin(rows_min, axis=1)
+
+    idx = np.unique(np.concatenate([[0, npoints-1], imin, imax]))
+    idx = idx[idx < npoints]
+
+    return x[idx], y[idx]
+
+
+def downsample_lttb(x, y, n):
+    """
+    Largest-Triangle-Three-Buckets (Steinarsson 2013): n points that keep the
+    visual shape of the series
+    """
+    npoints = len(x)
+
+    bounds = np.linspace(1, npoints-1, n-1).astype('int64')
+
+    idx = np.zeros(n, dtype='int64')
+    idx[-1] = npoints - 1
+
+    a = 0
+    for i in range(n-2):
+        i1, i2 = bounds[i], bounds[i+1]
+
+        # average of the next bucket
+        j1, j2 = i2, bounds[i+2] if i+2 < n-1 else npoints
+        avg_x, avg_y = np.mean(x[j1:j2]), np.mean(y[j1:j2])
+
+        # point of this bucket with the largest triangle (a, point, next average)
+        area = np.abs((x[a] - avg_x) * (y[i1:i2] - y[a]) - (x[a] - x[i1:i2]) * (avg_y - y[a]))
+        a = i1 + np.argmax(area)
+        idx[i+1] = a
+
+    return x[idx], y[idx]
+
+
+def downsample(x, y, n=800, method='lttb'):
+    """
+    Reduce the series (sorted in x) to about n points, n ~ canvas width in pixels.
+    method: 'lttb' or 'minmax'
+    """
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+
+    if len(x) <= n or n < 3:
+        return x, y
+
+    if method == 'lttb':
+        return downsample_lttb(x, y, n)
+    elif method == 'minmax':
+        return downsample_minmax(x, y, n)
+
+    raise ValueError('unknown downsample method: %s' % method)
+
+
+def guess_binning(array, method=None, **kwargs):
+    """
+    - method=None: (100, xmin, xmax) with the min/max values (xmax just above the
+      max, so it is not sent to the overflow)
+    - method='fd', 'scott', 'knuth' or 'quantile': bin edges to use as xbins
+      (see binning.guess_edges for the options)
+    array can also be a memmap, a .npy path or an iterable of chunks
+    """
+    from rootils.binning import guess_edges
+    from rootils.stream import iter_chunks
+
+    if method is not None:
+        return guess_edges(array, method, **kwargs)
+
+    # single pass, chunk by chunk
+    xmin, xmax = np.inf, -np.inf
+    for chunk in iter_chunks(array):
+        if len(chunk):
+            xmin = min(xmin, np.nanmin(chunk))
+            xmax = max(xmax, np.nanmax(chunk))
+
+    if not xmin <= xmax:
+        raise ValueError('no finite values to compute the binning')
+
+    # no rounding: small ranges (e.g. [0.1, 0.4]) would end in the flow bins
+    if xmin == xmax:
+        return (100, float(xmin) - 0.5, float(xmax) + 0.5)
+
+    return (100, float(xmin), float(np.nextafter(xmax, np.inf)))
+
+
+def buffer_to_array(buf, n, dtype='float64'):
+    """
+    NumPy view (no copy) of the first n elements of a C++ buffer (e.g. GetArray(), GetX())
+    """
+    if n == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.frombuffer(buf, dtype=dtype, count=n)
+
+
+_storage_dtypes = [
+    ('TArrayD', 'float64'),
+    ('TArrayF', 'float32'),
+    ('TArrayI', 'int32'),
+    ('TArrayL64', 'int64'),
+    ('TArrayS', 'int16'),
+    ('TArrayC', 'int8'),
+]
+
+def hist_buffer(hist):
+    """
+    NumPy view (no copy) of the hist contents, flow bins included, in ROOT global bin order
+    """
+    for cls, dtype in _storage_dtypes:
+        if hist.InheritsFrom(cls):
+            return buffer_to_array(hist.GetArray(), hist.GetNcells(), dtype)
+
+    raise TypeError('%s has no array storage' % hist.ClassName())
+
+
+def axis_binning(axis):
+    """
+    Return (nbins, min, max, edges) for a TAxis. edges is None for fixed size bins
+    """
+    nbins = axis.GetNbins()
+    edges = None
+    if axis.IsVariableBinSize():
+        edges = buffer_to_array(axis.GetXbins().GetArray(), nbins+1).copy()
+
+    return nbins, axis.GetXmin(), axis.GetXmax(), edges
+
+
+def find_bins(array, nx, xmin, xmax, xbins=None):
+    """
+    Vectorized TAxis::FindBin: ROOT bin number for each value in array,
+    0 for underflow and nx+1 for overflow (NaN goes to overflow, as in ROOT)
+    """
+    array = np.asarray(array, dtype='float64')
+
+    under = array < xmin
+    over  = ~(array < xmax)
+    inside = ~(under | over)
+
+    bins = np.empty(array.shape, dtype='int64')
+    bins[under] = 0
+    bins[over] = nx + 1
+
+    if xbins is not None:
+        bins[inside] = np.searchsorted(xbins, array[inside], side='right')
     else:
-        ax = np.asarray(x, 'float64')
-        ay = np.asarray(y, 'float64')
+        # same operations order as TAxis::FindFixBin, including its correction
+        # against the bin edges for values at (or rounded across) an edge
+        values = array[inside]
+        width = (xmax - xmin) / nx
+        b = 1 + (nx * (values - xmin) / (xmax - xmin)).astype('int64')
+        b[values < xmin + (b - 1) * width] -= 1
+        b[values >= xmin + b * width] += 1
+        bins[inside] = b
 
-    return create_TGraph(ax[:], ay[:])
+    return bins, inside
 
 
-def guess_binning(array):
-    xmin = round(np.min(array), 0)
-    xmax = round(np.max(array), 0)
-    return (100, xmin, xmax)
+def bin_sums(bins, w, ncells):
+    """
+    Sum of weights and sum of squared weights per cell
+    """
+    if w is None:
+        sumw = np.bincount(bins, minlength=ncells).astype('float64')
+        return sumw, sumw.copy()
 
+    sumw  = np.bincount(bins, weights=w, minlength=ncells)
+    sumw2 = np.bincount(bins, weights=w*w, minlength=ncells)
 
-def array_to_hist(array, nx=100, xmin=None, xmax=None, xbins=None, w=None):
+    return sumw, sumw2
 
-    hist = create_TH1(nx, xmin, xmax, xbins)
+
+def fill_stats(x, w=None):
+    """
+    [sumw, sumw2, sumwx, sumwx2] for the in-range entries, as TH1::GetStats
+    """
+    if w is None:
+        n = float(len(x))
+        return np.array([n, n, np.sum(x), np.sum(x*x)])
+
+    return np.array([np.sum(w), np.sum(w*w), np.sum(w*x), np.sum(w*x*x)])
+
+
+def fill_stats2d(x, y, w=None):
+    """
+    [sumw, sumw2, sumwx, sumwx2, sumwy, sumwy2, sumwxy] for the in-range entries, as TH2::GetStats
+    """
+    if w is None:
+        n = float(len(x))
+        return np.array([n, n, np.sum(x), np.sum(x*x), np.sum(y), np.sum(y*y), np.sum(x*y)])
+
+    return np.array([np.sum(w), np.sum(w*w), np.sum(w*x), np.sum(w*x*x),
+                     np.sum(w*y), np.sum(w*y*y), np.sum(w*x*y)])
+
+
+def add_hist_content(hist, sumw, sumw2, stats, entries):
+    """
+    Add per-cell sums (flow bins included), stats and number of entries to hist
+    with a few calls, instead of one call per bin
+    """
+    ncells = hist.GetNcells()
+
+    content = hist_buffer(hist).astype('float64')
+
+    old_stats = array('d', [0.]*13)
+    hist.GetStats(old_stats)
+    nstats = len(stats)
+    new_stats = array('d', [ a + b for a, b in zip(old_stats[:nstats], stats) ])
+
+    old_entries = hist.GetEntries()
+
+    # Fill() would enable Sumw2 with the first weight != 1
+    if hist.GetSumw2N() == 0 and np.any(sumw2 != sumw):
+        hist.Sumw2()
+
+    if hist.GetSumw2N() > 0:
+        errors = buffer_to_array(hist.GetSumw2().GetArray(), ncells) + sumw2
+        hist.SetContent(content + sumw)
+        hist.GetSumw2().Set(ncells, errors)
+    else:
+        hist.SetContent(content + sumw)
+
+    hist.PutStats(new_stats)
+    hist.SetEntries(old_entries + entries)
+
+
+def fill_hist(hist, array, w=None):
+    """
+    Fill hist with all the values of array (and weights w) at once.
+    Same result as calling hist.Fill(x, w) for each value:
+    contents, errors, underflow/overflow, entries and stats
+    """
+    array = np.asarray(array, dtype='float64').ravel()
     if w is not None:
-        for x, w in zip(array, w):
-            hist.Fill(x, w)
+        w = np.asarray(w, dtype='float64').ravel()
+
+    nx, xmin, xmax, xbins = axis_binning(hist.GetXaxis())
+
+    bins, inside = find_bins(array, nx, xmin, xmax, xbins)
+
+    sumw, sumw2 = bin_sums(bins, w, hist.GetNcells())
+
+    stats = fill_stats(array[inside], w[inside] if w is not None else None)
+
+    add_hist_content(hist, sumw, sumw2, stats, len(array))
+
+    return hist
+
+
+def fill_hist2d(hist, x, y, w=None):
+    """
+    Fill a TH2 with all the (x, y) values (and weights w) at once.
+    Same result as calling hist.Fill(x, y, w) for each pair
+    """
+    x = np.asarray(x, dtype='float64').ravel()
+    y = np.asarray(y, dtype='float64').ravel()
+    if w is not None:
+        w = np.asarray(w, dtype='float64').ravel()
+
+    nx, xmin, xmax, xbins = axis_binning(hist.GetXaxis())
+    ny, ymin, ymax, ybins = axis_binning(hist.GetYaxis())
+
+    binsx, insidex = find_bins(x, nx, xmin, xmax, xbins)
+    binsy, insidey = find_bins(y, ny, ymin, ymax, ybins)
+
+    # global bin = binx + (nx+2) * biny
+    bins = binsx + (nx + 2) * binsy
+    inside = insidex & insidey
+
+    sumw, sumw2 = bin_sums(bins, w, hist.GetNcells())
+
+    stats = fill_stats2d(x[inside], y[inside], w[inside] if w is not None else None)
+
+    add_hist_content(hist, sumw, sumw2, stats, len(x))
+
+    return hist
+
+
+def hist_to_array(hist, flow=False):
+    """
+    Read-only access to the hist contents as a NumPy view (no copy).
+    For TH2 the returned array is indexed as [binx, biny]
+    """
+    if hist.InheritsFrom('TProfile') or hist.InheritsFrom('TProfile2D'):
+        raise TypeError('the storage of %s has the sums of y, not the bin contents' % hist.ClassName())
+
+    view = hist_buffer(hist)
+
+    if hist.InheritsFrom('TH2'):
+        nx, ny = hist.GetNbinsX(), hist.GetNbinsY()
+        view = view.reshape(ny+2, nx+2).T
+
+    if not flow:
+        view = view[1:-1] if view.ndim == 1 else view[1:-1,1:-1]
+
+    view.flags.writeable = False
+
+    return view
+
+
+def array_to_hist(array, nx=100, xmin=None, xmax=None, xbins=None, w=None, n_jobs=1):
+
+    hist = create_TH1(nx, xmin, xmax, xbins)
+
+    if isinstance(array, np.memmap) and n_jobs == 1:
+        # memmaps (e.g. from cache.TreeCache) are filled chunk by chunk, never fully loaded
+        from rootils.stream import stream_fill
+        stream_fill(hist, array, w)
+    elif n_jobs == 1:
+        fill_hist(hist, array, w)
     else:
-        for x in array:
-            hist.Fill(x)
+        from rootils.stream import fill_parallel
+        fill_parallel(hist, array, w=w, n_jobs=n_jobs)
 
     return hist
 
 
-def array_to_hist2d(array):
+def _binning_args(bins):
+    # bins: (nx, xmin, xmax) or bin edges
+    if len(bins) == 3 and isinstance(bins, tuple):
+        return bins
+    return (len(bins)-1, array('d', bins))
+
+
+def tree_to_hists(tree, x, selection='', weight=None, bins=None, n_threads=0):
+    """
+    Histograms of the branches/expressions x from a TTree/TChain, all booked on
+    a RDataFrame and filled in a single multi-threaded event loop.
+    - selection, weight: branch names or expressions
+    - bins: (nx, xmin, xmax) or edges for all the variables, None for automatic binning
+    - n_threads: the loop runs in n_threads threads (0: all the cores). The ROOT
+      implicit multi-threading is only enabled for this loop, and not changed if it
+      is already enabled. None uses the current setting (single threaded if off)
+    """
+    if isinstance(x, str):
+        x = [x,]
+
+    enable_mt = n_threads is not None and not ROOT.IsImplicitMTEnabled()
+    if enable_mt:
+        ROOT.EnableImplicitMT(n_threads)
+
+    try:
+        return _tree_to_hists(tree, x, selection, weight, bins)
+    finally:
+        if enable_mt:
+            ROOT.DisableImplicitMT()
+
+
+def _tree_to_hists(tree, x, selection, weight, bins):
+
+    df = ROOT.RDataFrame(tree)
+    if selection:
+        df = df.Filter(selection)
+
+    if weight is not None and not df.HasColumn(weight):
+        df = df.Define('rootils_weight', 'double(%s)' % weight)
+        weight = 'rootils_weight'
+
+    # book everything first, the loop runs once at the first GetValue
+    results = []
+    for i, var in enumerate(x):
+        name = 'h_%i_%s' % (i, var)
+        column = var
+        if not df.HasColumn(var):
+            column = 'var_%i' % i
+            df = df.Define(column, var)
+
+        args = (column,) if weight is None else (column, weight)
+        if bins is not None:
+            model = ROOT.RDF.TH1DModel(name, '', *_binning_args(bins))
+            args = (model,) + args
+
+        results.append((name, df.Histo1D(*args)))
+
+    hists = []
+    for name, res in results:
+        hist = res.GetValue().Clone(name)
+        hist.SetDirectory(0)
+        registry.track(hist)
+        if hist.GetSumw2N() == 0:
+            hist.Sumw2()
+        set_default_hist_style(hist)
+        hists.append(hist)
+
+    return hists
+
+
+def array_to_hist2d(x, y=None, w=None, nx=100, xmin=None, xmax=None, ny=100, ymin=None, ymax=None, xbins=None, ybins=None, n_jobs=1):
+    """
+    - x: 2d array, y: None -> bin (i+1, j+1) content is x[i,j]
+    - x, y: arrays of values (w: weights) -> filled as hist.Fill(x, y, w)
+    n_jobs != 1 fills the events in parallel (see stream.fill_parallel)
+    """
+
+    # matrix
+    if y is None:
+        matrix = np.asarray(x, dtype='float64')
+        nx, ny = matrix.shape
+
+        hist = create_TH2(nx, 0, nx, ny, 0, ny)
+
+        # copy the whole matrix in the internal storage (global bin = binx + (nx+2)*biny)
+        content = np.zeros((ny+2, nx+2))
+        content[1:-1,1:-1] = matrix.T
+        hist.SetContent(content.ravel())
+        hist.SetEntries(nx*ny)
 
-    nx, ny = array.shape
+        return hist
 
-    hist = create_TH2(nx, 0, ny, nx, 0, ny)
+    # events
+    if xbins is None and (xmin is None or xmax is None):
+        nx, xmin, xmax = guess_binning(x)
+    if ybins is None and (ymin is None or ymax is None):
+        ny, ymin, ymax = guess_binning(y)
 
-    for x in range(nx):
-        for y in range(ny):
-            hist.SetBinContent(x+1, y+1, array[x,y])
+    hist = create_TH2(nx, xmin, xmax, ny, ymin, ymax, xbins, ybins)
+
+    if n_jobs == 1:
+        fill_hist2d(hist, x, y, w)
+    else:
+        from rootils.stream import fill_parallel
+        fill_parallel(hist, x, y, w, n_jobs=n_jobs)
 
     return hist
@@ -0,0 +1,78 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import ROOT
+
+ROOT.PyConfig.IgnoreCommandLineOptions = True
+ROOT.gROOT.SetBatch(True)
+ROOT.gErrorIgnoreLevel = ROOT.kWarning
+
+
+@pytest.fixture
+def rng():
+    import numpy as np
+    return np.random.default_rng(42)
+
+
+@pytest.fixture(scope='session')
+def rools():
+    """
+    The rools script as a module
+    """
+    import importlib.util
+    import importlib.machinery
+
+    if 'rools' in sys.modules:
+        return sys.modules['rools']
+
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts', 'rools')
+    loader = importlib.machinery.SourceFileLoader('rools', path)
+    module = importlib.util.module_from_spec(importlib.util.spec_from_loader('rools', loader))
+
+    # the process pools unpickle functions from it
+    sys.modules['rools'] = module
+    loader.exec_module(module)
+
+    return module
+
+
+@pytest.fixture(scope='session')
+def root_file(tmp_path_factory):
+    """
+    A file with a TH1F hist, a TH2F h2, a tree (x, w, i) and dir/hd
+    """
+    import numpy as np
+
+    path = str(tmp_path_factory.mktemp('rools') / 'f.root')
+
+    rng = np.random.default_rng(1)
+    f = ROOT.TFile(path, 'recreate')
+
+    h = ROOT.TH1F('hist', '', 10, 0, 10)
+    for x in (3.5, 3.5, 3.5, 5.5):
+        h.Fill(x)
+
+    h2 = ROOT.TH2F('h2', '', 4, 0, 4, 3, 0, 3)
+    h2.Fill(1.5, 0.5)
+
+    tree = ROOT.TTree('tree', '')
+    x, w, i = np.zeros(1), np.zeros(1), np.zeros(1, dtype='int32')
+    tree.Branch('x', x, 'x/D')
+    tree.Branch('w', w, 'w/D')
+    tree.Branch('i', i, 'i/I')
+    for n in range(1000):
+        x[0], w[0], i[0] = rng.normal(), rng.uniform(0.5, 1.5), n
+        tree.Fill()
+
+    d = f.mkdir('dir')
+    d.cd()
+    hd = ROOT.TH1D('hd', '', 5, 0, 5)
+    hd.Fill(1.5, 10.)
+
+    f.Write()
+    f.Close()
+
+    return path
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+import rootils.utils as ut
+from rootils.binning import Summary, guess_edges, rank_error
+
+
+def test_summary_chunks(rng):
+    x = rng.normal(3, 2, size=50000)
+
+    summary = Summary(sample_size=1000, seed=1)
+    for chunk in np.array_split(x, 7):
+        summary.update(np.append(chunk, np.nan))
+
+    assert summary.n == len(x)
+    assert (summary.vmin, summary.vmax) == (x.min(), x.max())
+    np.testing.assert_allclose(summary.mean, x.mean())
+    np.testing.assert_allclose(summary.std, x.std())
+    assert len(summary.sample) == 1000 and not summary.exact
+    assert set(summary.sample) <= set(x)
+
+
+@pytest.mark.parametrize('method', ['fd', 'scott'])
+def test_guess_edges_numpy(rng, method):
+    # exact (all the values in the sample): same number of bins as numpy
+    x = rng.normal(size=5000)
+    edges = guess_edges(x, method)
+
+    assert len(edges) == len(np.histogram_bin_edges(x, method))
+    assert edges[0] == x.min() and edges[-1] > x.max()
+
+
+def test_guess_edges_quantile(rng, tmp_path):
+    x = rng.exponential(size=200000)
+    path = str(tmp_path / 'x.npy')
+    np.save(path, x)
+
+    edges = guess_edges(path, 'quantile', nbins=10, sample_size=20000, chunk_size=30000, seed=1)
+    counts, _ = np.histogram(x, edges)
+
+    assert len(edges) == 11 and counts.sum() == len(x)
+    assert np.all(np.abs(counts / len(x) - 0.1) < 2*rank_error(20000))
+
+
+def test_guess_binning_methods(rng):
+    x = rng.normal(size=2000)
+
+    edges = ut.guess_binning(x, 'knuth')
+    assert 2 < len(edges) < 100
+
+    with pytest.raises(ValueError):
+        ut.guess_binning(x, 'nothing')
+    with pytest.raises(ValueError):
+        ut.guess_binning(np.full(10, np.nan), 'fd')
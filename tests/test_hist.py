@@ -0,0 +1,89 @@
+import numpy as np
+import ROOT
+
+from rootils.hist import Hist
+
+from test_utils import root_fill, assert_same_hist
+
+
+def test_to_root(rng):
+    x = rng.normal(size=5000)
+    w = rng.uniform(0.5, 2, size=len(x))
+
+    hist = Hist.from_array(x, w=w, nx=20, xmin=-3, xmax=3).to_root()
+
+    assert hist.ClassName() == 'TH1D'
+    assert not hist.GetXaxis().IsVariableBinSize()
+    ref = root_fill(ROOT.TH1D('to_root_ref', '', 20, -3, 3), x, w)
+    assert_same_hist(hist, ref)
+    np.testing.assert_allclose(hist.GetEffectiveEntries(), ref.GetEffectiveEntries())
+
+    hist = Hist.from_array(x, xbins=[-3, -1, 0, 0.5, 3]).to_root()
+    assert hist.GetXaxis().IsVariableBinSize()
+
+
+def test_to_root_2d(rng):
+    x, y = rng.normal(size=(2, 3000))
+
+    hist = Hist.from_array(x, y, nx=10, xmin=-3, xmax=3, ny=5, ymin=-2, ymax=2).to_root()
+
+    ref = ROOT.TH2D('to_root_ref2', '', 10, -3, 3, 5, -2, 2)
+    for a, b in zip(x, y):
+        ref.Fill(a, b)
+
+    assert hist.ClassName() == 'TH2D'
+    assert_same_hist(hist, ref)
+    np.testing.assert_allclose(hist.GetCorrelationFactor(), ref.GetCorrelationFactor())
+
+
+def test_root_round_trip(rng):
+    x = rng.normal(size=1000)
+    ref = root_fill(ROOT.TH1D('round_trip', '', 10, -2, 2), x)
+    ref.Scale(0.5)
+
+    assert_same_hist(Hist.from_root(ref).to_root(), ref)
+
+    # stats of the in-range entries are not known after slicing: from the bin centers
+    h = Hist.from_root(ref)[2:8]
+    assert h.stats is None
+    assert h.to_root().GetEntries() == ref.GetEntries()
+
+
+def test_operations(rng):
+    x = rng.normal(size=2000)
+    y = rng.normal(size=len(x))
+
+    h = Hist.from_array(x, nx=20, xmin=-3, xmax=3)
+    ref = root_fill(ROOT.TH1D('ops_ref', '', 20, -3, 3), x)
+
+    ref2 = ref.Clone('ops_ref2')
+    ref2.Add(ref)
+    assert_same_hist((h + h).to_root(), ref2)
+
+    ref2 = ref.Clone('ops_scaled')
+    ref2.Scale(0.5)
+    assert_same_hist((0.5*h).to_root(), ref2)
+
+    assert_same_hist(h.rebin(4).to_root(), ref.Rebin(4, 'ops_rebin'))
+
+    h2 = Hist.from_array(x, y, nx=10, xmin=-3, xmax=3, ny=10, ymin=-3, ymax=3)
+    ref2d = ROOT.TH2D('ops_ref2d', '', 10, -3, 3, 10, -3, 3)
+    for a, b in zip(x, y):
+        ref2d.Fill(a, b)
+    assert_same_hist(h2.project(1).to_root(), ref2d.ProjectionY('ops_py'))
+
+
+def test_from_stream(rng):
+    from rootils.stream import HistStream
+
+    x = rng.normal(size=(1000, 2))
+
+    stream = HistStream(nx=10, xmin=-2, xmax=2, ny=5, ymin=-2, ymax=2)
+    for chunk in np.array_split(x, 3):
+        stream.update(chunk)
+
+    ref = ROOT.TH2D('stream_ref', '', 10, -2, 2, 5, -2, 2)
+    for a, b in x:
+        ref.Fill(a, b)
+
+    assert_same_hist(Hist.from_stream(stream).to_root(), ref)
@@ -0,0 +1,208 @@
+import numpy as np
+import ROOT
+
+
+def test_hist_arrays_th2_layout(rools):
+    h = ROOT.TH2F('arr_h2', '', 4, 0, 4, 3, 0, 3)
+    h.Fill(2.5, 0.5, 3.)
+    edges, contents, errors = rools.hist_arrays(h)
+    assert contents.shape == (6, 5)
+    assert contents[3, 1] == 3.
+    assert len(edges) == 2
+
+
+def test_hist_arrays_profile(rools):
+    p = ROOT.TProfile('arr_prof', '', 4, 0, 4)
+    for x, y in [(3.5, 3), (3.5, 4), (3.5, 5), (1.5, 2)]:
+        p.Fill(x, y)
+    _, contents, errors = rools.hist_arrays(p)
+    np.testing.assert_allclose(contents, [ p.GetBinContent(i) for i in range(6) ])
+    np.testing.assert_allclose(errors, [ p.GetBinError(i) for i in range(6) ])
+
+
+def test_hist_arrays_long(rools):
+    h = ROOT.TH1L('arr_l', '', 4, 0, 4)
+    for x in (1.5, 1.5, 2.5):
+        h.Fill(x)
+    _, contents, _ = rools.hist_arrays(h)
+    assert list(contents) == [0, 0, 2, 1, 0, 0]
+
+
+def test_cached_files_reset(rools, root_file):
+    # the server keeps the files open, the objects must be read again in each request
+    rools._file_cache = rools.OrderedDict()
+    rools._file_cache.maxsize = 4
+    try:
+        for name in ('hist', 'dir/hd'):
+            f = rools.open_file(root_file)
+            h = f.Get(name)
+            integral = h.Integral()
+            h.Scale(10)
+            rools.reset_cached_files()
+
+            f = rools.open_file(root_file)
+            assert f.Get(name).Integral() == integral
+    finally:
+        for _, f in rools._file_cache.values():
+            f.Close()
+        rools._file_cache = None
+
+
+def test_server_bad_requests(rools, tmp_path):
+    import json
+    import socket
+    import pytest
+
+    for data in (b'garbage', json.dumps({'argv': [1], 'cwd': '/'}).encode(), json.dumps([]).encode()):
+        a, b = socket.socketpair()
+        a.sendall(data)
+        a.close()
+        with pytest.raises(ValueError):
+            rools.read_request(b)
+        b.close()
+
+    with pytest.raises(ValueError):
+        rools.handle_request({'argv': ['x.root'], 'cwd': str(tmp_path / 'missing')}, str(tmp_path))
+
+
+def test_iter_tree_batches(rools, root_file):
+    f = ROOT.TFile.Open(root_file)
+    tree = f.Get('tree')
+
+    batches = list(rools.iter_tree_batches(tree, ['i', 'x*2'], 'x > 0', batch_size=300))
+    assert len(batches) == 4
+
+    i = np.concatenate([ b[0] for b in batches ])
+    x2 = np.concatenate([ b[1] for b in batches ])
+    ref = ROOT.RDataFrame(tree).Filter('x > 0').AsNumpy(['i', 'x'])
+    assert list(i) == list(ref['i'])
+    np.testing.assert_allclose(x2, 2*ref['x'])
+    f.Close()
+
+
+def test_sort_rows_external(rools, rng):
+    batches = []
+    for _ in range(5):
+        x = rng.normal(size=200)
+        batches.append([x, np.array([ str(v) for v in x ], dtype=object)])
+
+    for descending in (False, True):
+        rows = list(rools.sort_rows(iter(batches), 0, descending))
+        x = np.concatenate([ b[0] for b in batches ])
+        assert [ r[0] for r in rows ] == sorted(x, reverse=descending)
+        assert all(str(r[0]) == r[1] for r in rows)
+
+    top = list(rools.sort_rows(iter(batches), 0, limit=3))
+    assert [ r[0] for r in top ] == sorted(np.concatenate([ b[0] for b in batches ]))[:3]
+
+
+def test_merge_hists(rools, root_file, tmp_path):
+    import shutil
+    import pytest
+
+    paths = []
+    for i in range(3):
+        paths.append(str(tmp_path / ('f%i.root' % i)))
+        shutil.copy(root_file, paths[-1])
+
+    h = rools.merge_hists(paths, 'hist', jobs=2, progress=False)
+    f = ROOT.TFile.Open(root_file)
+    ref = f.Get('hist')
+    assert [ h.GetBinContent(i) for i in range(12) ] == [ 3*ref.GetBinContent(i) for i in range(12) ]
+    assert h.GetEntries() == 3*ref.GetEntries()
+    f.Close()
+
+    with pytest.raises(KeyError, match=r'f\d.root does not have missing'):
+        rools.merge_hists(paths, 'missing', jobs=2, progress=False)
+
+
+def run(rools, capfd, *argv):
+    # main output, python and ROOT (fd level)
+    capfd.readouterr()
+    code = rools.main(list(argv) + ['--no-server'])
+    out, err = capfd.readouterr()
+    assert not code, err
+    return out.splitlines()
+
+
+def test_list(rools, capfd, root_file):
+    assert set(run(rools, capfd, root_file)) == {'hist', 'h2', 'tree', 'dir'}
+    assert 'hist [TH1F]' in run(rools, capfd, '-t', root_file)
+
+
+def test_print_hist(rools, capfd, root_file):
+    out = run(rools, capfd, root_file, 'hist', '--xrange', '4:6')
+    assert out == ['[3.00, 4.00] : 3.00 +- 1.73', '[4.00, 5.00] : 0.0000 +- 0.0000', '[5.00, 6.00] : 1.00 +- 1.00']
+
+    out = run(rools, capfd, root_file, 'hist', '--format', 'csv')
+    assert out[0] == 'bin,content,error'
+    assert out[4] == '"[3.00, 4.00]",3.0,1.7320508075688772'
+
+    assert run(rools, capfd, root_file, 'hist', '--cmd', 'GetEntries') == ['4.0']
+
+
+def test_count(rools, capfd, root_file):
+    f = ROOT.TFile.Open(root_file)
+    w = ROOT.RDataFrame(f.Get('tree')).Filter('x > 0').AsNumpy(['w'])['w']
+    f.Close()
+
+    assert run(rools, capfd, root_file, 'tree', '-c') == ['1000.00 +- 31.62']
+    out = run(rools, capfd, root_file, 'tree', '-c', '-s', 'x > 0', '-w', 'w')
+    assert out == ['%.2f +- %.2f' % (w.sum(), np.sqrt((w*w).sum()))]
+
+
+def test_scan(rools, capfd, root_file):
+    f = ROOT.TFile.Open(root_file)
+    ref = ROOT.RDataFrame(f.Get('tree')).Filter('x > 1').AsNumpy(['x', 'i'])
+    f.Close()
+
+    out = run(rools, capfd, root_file, 'tree', '--scan', 'i:x', '-s', 'x > 1', '--sort', 'x', '-r', '-n', '5', '--format', 'csv')
+    assert out[0] == 'i,x'
+    order = np.argsort(-ref['x'])[:5]
+    assert [ int(line.split(',')[0]) for line in out[1:] ] == list(ref['i'][order])
+
+
+def test_batch(rools, capfd, root_file, tmp_path):
+    import json
+
+    commands = tmp_path / 'commands.txt'
+    commands.write_text('%s hist\n%s tree -c\n./missing.root hist\n%s nothing\n' % ((root_file,)*2 + (root_file,)))
+
+    code = rools.main(['--batch', str(commands), '--no-server'])
+    results = [ json.loads(line) for line in capfd.readouterr()[0].splitlines() ]
+    assert code == 1
+
+    by_line = { r['line']: r for r in results }
+    assert by_line[1]['contents'][4] == 3.
+    assert by_line[2]['count'] == 1000.
+    assert 'error' in by_line[3] and 'error' in by_line[4]
+
+
+def test_export(rools, capfd, root_file, tmp_path):
+    output = str(tmp_path / 'out.npz')
+    run(rools, capfd, root_file, '--export', output)
+
+    data = np.load(output)
+    assert str(data['hist/class']) == 'TH1F'
+    assert list(data['hist/contents'][4:7]) == [3., 0., 1.]
+    assert list(data['dir/hd/contents'][:3]) == [0., 0., 10.]
+
+
+def test_directory(rools, capfd, root_file, tmp_path, monkeypatch):
+    import shutil
+
+    monkeypatch.setenv('ROOLS_CACHE', str(tmp_path / 'cache'))
+
+    d = tmp_path / 'dir'
+    d.mkdir()
+    for i in range(3):
+        shutil.copy(root_file, str(d / ('f%i.root' % i)))
+
+    assert set(run(rools, capfd, str(d))) == {'hist', 'h2', 'tree', 'dir'}
+    assert run(rools, capfd, str(d), 'tree', '-c') == ['3000.00 +- 54.77']
+
+    output = str(tmp_path / 'merged.root')
+    run(rools, capfd, str(d), 'hist', '-o', output)
+    f = ROOT.TFile.Open(output)
+    assert f.Get('hist').GetBinContent(4) == 9.
+    f.Close()
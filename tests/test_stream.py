@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+import rootils.utils as ut
+import rootils.stream as st
+
+from test_utils import root_fill, assert_same_hist
+
+
+def test_stream_to_hist(rng, tmp_path):
+    x = rng.normal(size=10000)
+    w = rng.integers(1, 4, size=len(x)).astype('float64')
+
+    path = str(tmp_path / 'x.npy')
+    np.save(path, x)
+
+    h = st.stream_to_hist(path, weights=w, chunk_size=999, nx=20, xmin=-3, xmax=3)
+    assert_same_hist(h, root_fill(ut.create_TH1(20, -3, 3), x, w))
+
+
+def test_stream_weights_length(rng):
+    x = rng.normal(size=1000)
+
+    # fewer weights, in the last chunk or in the number of chunks
+    for w in (np.ones(999), np.ones(500)):
+        with pytest.raises(ValueError):
+            st.stream_to_hist(x, weights=w, chunk_size=100, nx=10, xmin=-3, xmax=3)
+
+    with pytest.raises(ValueError):
+        st.stream_fill(ut.create_TH1(10, -3, 3), x, weights=np.ones(1001), chunk_size=100)
+
+
+@pytest.mark.parametrize('backend', ['process', 'thread'])
+def test_fill_parallel(rng, backend):
+    x = rng.normal(size=20000)
+    y = rng.normal(size=len(x))
+    w = rng.integers(1, 4, size=len(x)).astype('float64')
+
+    h = st.fill_parallel(ut.create_TH1(50, -3, 3), x, w=w, n_jobs=3, backend=backend)
+    assert_same_hist(h, root_fill(ut.create_TH1(50, -3, 3), x, w))
+
+    h2 = st.fill_parallel(ut.create_TH2(10, -3, 3, 10, -3, 3), x, y, n_jobs=3, backend=backend)
+    r2 = ut.create_TH2(10, -3, 3, 10, -3, 3)
+    for a, b in zip(x, y):
+        r2.Fill(a, b)
+    assert_same_hist(h2, r2)
+
+
+def test_fill_parallel_lengths(rng):
+    x = rng.normal(size=100)
+    with pytest.raises(ValueError):
+        st.fill_parallel(ut.create_TH1(10, -3, 3), x, w=np.ones(99))
+    with pytest.raises(ValueError):
+        st.fill_parallel(ut.create_TH2(10, -3, 3, 10, -3, 3), x, x[:50])
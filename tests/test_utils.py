@@ -0,0 +1,204 @@
+import numpy as np
+import ROOT
+
+import rootils.utils as ut
+
+
+def root_fill(hist, values, w=None):
+    for i, v in enumerate(values):
+        if w is None:
+            hist.Fill(v)
+        else:
+            hist.Fill(v, w[i])
+    return hist
+
+
+def assert_same_hist(h1, h2):
+    n = h1.GetNcells()
+    assert h1.GetEntries() == h2.GetEntries()
+    assert [ h1.GetBinContent(i) for i in range(n) ] == [ h2.GetBinContent(i) for i in range(n) ]
+    np.testing.assert_allclose([ h1.GetBinError(i) for i in range(n) ], [ h2.GetBinError(i) for i in range(n) ])
+    np.testing.assert_allclose(h1.GetMean(), h2.GetMean())
+    np.testing.assert_allclose(h1.GetStdDev(), h2.GetStdDev())
+
+
+def test_find_bins_edges(rng):
+    # values on (or rounded to) the bin edges, as TAxis::FindFixBin
+    for nx, xmin, xmax in [(100, 0, 1), (10, -1, 1), (37, 0.1, 7.3), (3, 0, 0.3)]:
+        axis = ROOT.TAxis(nx, xmin, xmax)
+        values = np.concatenate([np.round(rng.uniform(xmin-0.1, xmax+0.1, 2000), 2),
+                                 np.linspace(xmin, xmax, nx+1), np.linspace(xmin, xmax, 3*nx+1)])
+        bins, _ = ut.find_bins(values, nx, xmin, xmax)
+        assert list(bins) == [ axis.FindFixBin(v) for v in values ]
+
+
+def test_find_bins_variable(rng):
+    edges = np.array([0., 0.1, 0.25, 0.5, 1.])
+    axis = ROOT.TAxis(len(edges)-1, edges)
+    values = np.concatenate([edges, rng.uniform(-0.2, 1.2, 1000), [np.nan]])
+    bins, _ = ut.find_bins(values, len(edges)-1, edges[0], edges[-1], edges)
+    assert list(bins) == [ axis.FindFixBin(v) for v in values ]
+
+
+def test_fill_hist_edges():
+    values = np.round(np.arange(0, 1.01, 0.01), 2)
+    h1 = ut.fill_hist(ROOT.TH1D('fill_a', '', 100, 0, 1), values)
+    h2 = root_fill(ROOT.TH1D('fill_b', '', 100, 0, 1), values)
+    assert_same_hist(h1, h2)
+
+
+def test_fill_hist_weights(rng):
+    x = rng.normal(size=5000)
+    w = rng.uniform(0.5, 2, size=5000)
+    h1 = ut.fill_hist(ROOT.TH1D('fillw_a', '', 40, -3, 3), x, w)
+    h2 = root_fill(ROOT.TH1D('fillw_b', '', 40, -3, 3), x, w)
+    assert_same_hist(h1, h2)
+
+
+def test_fill_hist2d_edges():
+    x = np.round(np.arange(0, 1.01, 0.01), 2)
+    y = x[::-1].copy()
+    h1 = ut.fill_hist2d(ROOT.TH2D('fill2_a', '', 100, 0, 1, 10, 0, 1), x, y)
+    h2 = ROOT.TH2D('fill2_b', '', 100, 0, 1, 10, 0, 1)
+    for a, b in zip(x, y):
+        h2.Fill(a, b)
+    assert_same_hist(h1, h2)
+
+
+def test_guess_binning_small_range(rng):
+    x = rng.uniform(0.1, 0.4, 1000)
+    nx, xmin, xmax = ut.guess_binning(x)
+    h = ut.array_to_hist(x, nx, xmin, xmax)
+    assert h.GetBinContent(0) == 0 and h.GetBinContent(nx+1) == 0
+    assert h.Integral() == len(x)
+
+
+def test_tree_to_hists_weight_expression(root_file):
+    f = ROOT.TFile.Open(root_file)
+    tree = f.Get('tree')
+
+    mt = ROOT.IsImplicitMTEnabled()
+    h, = ut.tree_to_hists(tree, ['x'], selection='x > 0', weight='w*2', bins=(20, -4, 4))
+    assert ROOT.IsImplicitMTEnabled() == mt
+
+    ref = ROOT.RDataFrame(tree).Filter('x > 0').Define('w2', 'w*2').Sum('w2').GetValue()
+    np.testing.assert_allclose(h.Integral(0, 21), ref)
+    f.Close()
+
+
+def test_async_writer(tmp_path):
+    import os
+    import pytest
+
+    canvas = ROOT.TCanvas('async_c', '', 400, 300)
+    h = ut.array_to_hist(np.arange(10.), 10, 0, 10)
+    h.Draw()
+
+    writer = ut.AsyncWriter(n_threads=2, tmp_dir=str(tmp_path))
+    paths = [ str(tmp_path / ('plot.%s' % ext)) for ext in ('png', 'pdf', 'svg') ]
+    for path in paths:
+        writer.save(canvas, path)
+    writer.flush()
+    assert all(os.path.getsize(path) > 0 for path in paths)
+
+    writer.save(canvas, str(tmp_path / 'missing' / 'plot.png'))
+    with pytest.raises(IOError):
+        writer.flush()
+    writer.close()
+
+
+def test_array_to_hist_memmap(rng, tmp_path):
+    x = rng.normal(size=3000)
+    path = str(tmp_path / 'x.npy')
+    np.save(path, x)
+
+    hist = ut.array_to_hist(np.load(path, mmap_mode='r'), 20, -3, 3)
+    assert_same_hist(hist, root_fill(ROOT.TH1F('memmap_ref', '', 20, -3, 3), x))
+
+
+def test_array_to_hist2d_matrix():
+    matrix = np.arange(12.).reshape(4, 3)
+    hist = ut.array_to_hist2d(matrix)
+
+    assert hist.GetNbinsX() == 4 and hist.GetNbinsY() == 3
+    assert hist.GetBinContent(3, 2) == matrix[2, 1]
+    assert np.array_equal(ut.hist_to_array(hist), matrix)
+
+
+def test_hist_to_array():
+    hist = ROOT.TH1D('view', '', 4, 0, 4)
+    hist.Fill(1.5, 2.)
+    hist.Fill(-1)
+
+    view = ut.hist_to_array(hist, flow=True)
+    assert list(view) == [1., 0., 2., 0., 0., 0.]
+    assert not view.flags.writeable
+
+    hist.Fill(3.5)
+    assert list(ut.hist_to_array(hist)) == [0., 2., 0., 1.]
+
+
+def graph_points(g):
+    # copies: the views are only valid while g is alive
+    return [ c.copy() for c in ut.graph_to_arrays(g) ]
+
+
+def test_sort_graph(rng):
+    x = rng.integers(0, 20, size=50).astype('float64')
+    y, ex, ey = rng.normal(size=(3, 50))
+
+    g = ROOT.TGraphErrors(50, x, y, ex, ey)
+    ref = g.Clone()
+    ref.Sort()
+
+    columns = graph_points(ut.sort_graph(g))
+    # TGraph::Sort is not stable, compare the sorted points
+    assert list(columns[0]) == list(graph_points(ref)[0])
+    assert sorted(zip(*columns)) == sorted(zip(*graph_points(ref)))
+
+    last = graph_points(ut.sort_graph(g, duplicates='last'))
+    assert list(last[0]) == sorted(set(x))
+    for xi, yi in zip(*last[:2]):
+        assert yi == y[x == xi][-1]
+
+    mean = graph_points(ut.sort_graph(g, duplicates='mean'))
+    for xi, yi, eyi in zip(mean[0], mean[1], mean[3]):
+        np.testing.assert_allclose(yi, y[x == xi].mean())
+        np.testing.assert_allclose(eyi, np.sqrt((ey[x == xi]**2).sum()) / (x == xi).sum())
+
+    by_y = graph_points(ut.sort_graph(g, sort_x=False))
+    assert list(by_y[1]) == sorted(y)
+
+
+def test_array_to_graph(rng):
+    x, y, e = rng.normal(size=(3, 100))
+
+    g = ut.array_to_graph(np.column_stack([x, y]))
+    assert g.ClassName() == 'TGraph'
+    assert [ list(c) for c in ut.graph_to_arrays(g) ] == [list(x), list(y)]
+
+    g = ut.array_to_graph(x, y, ey=(e, 2*e))
+    assert g.ClassName() == 'TGraphAsymmErrors'
+    assert list(ut.graph_to_arrays(g)[5]) == list(2*e)
+
+
+def test_downsample(rng):
+    x = np.arange(100000.)
+    y = np.cumsum(rng.normal(size=len(x)))
+
+    for method in ('lttb', 'minmax'):
+        xs, ys = ut.downsample(x, y, 800, method)
+        assert xs[0] == x[0] and xs[-1] == x[-1]
+        assert np.all(np.diff(xs) > 0)
+        assert np.array_equal(ys, y[xs.astype('int64')])
+
+    xs, ys = ut.downsample(x, y, 800, 'lttb')
+    assert len(xs) == 800
+
+    # the extremes are always kept
+    xs, ys = ut.downsample(x, y, 800, 'minmax')
+    assert len(xs) <= 802
+    assert ys.max() == y.max() and ys.min() == y.min()
+
+    xs, ys = ut.downsample(x[:500], y[:500], 800)
+    assert len(xs) == 500